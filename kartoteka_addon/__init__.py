@@ -11,13 +11,14 @@ bl_info = {
 import bpy
 import json
 import os
-from . import (fast_apply, place_pivot, add_modifiers, new_group, helper_panel,
+from . import hdri_proxy, image_pool, skybox_manager
+from . import (bounds, live_update, hdri_library, fast_apply, place_pivot, add_modifiers, new_group, helper_panel,
                operators, preview_panel,
                morph,
                prefs,
                custom_properties)
 
-modules = [fast_apply, place_pivot, add_modifiers, new_group, helper_panel,
+modules = [bounds, live_update, hdri_library, fast_apply, place_pivot, add_modifiers, new_group, helper_panel,
            operators, preview_panel,
            morph,
            prefs,
@@ -48,23 +49,41 @@ def load_settings():
 
 @bpy.app.handlers.persistent
 def load_post(dummy):
+    image_pool.clear()
+    skybox_manager.clear_hdri_pool()
     load_settings()
 
+@bpy.app.handlers.persistent
+def undo_post(dummy):
+    skybox_manager.forget_world_nodes()
+
+_handlers = (
+    (bpy.app.handlers.load_post, load_post),
+    (bpy.app.handlers.undo_post, undo_post),
+    (bpy.app.handlers.redo_post, undo_post),
+)
+
 def register():
     for module in modules:
         module.register()
 
     bpy.types.Scene.render_settings = bpy.props.PointerProperty(type=preview_panel.RenderSettings)
 
-    bpy.app.handlers.load_post.append(load_post)
+    for handlers, handler in _handlers:
+        handlers.append(handler)
 
 def unregister():
     save_settings()
 
+    for handlers, handler in _handlers:
+        if handler in handlers:
+            handlers.remove(handler)
+
     del bpy.types.Scene.render_settings
 
     for module in modules:
         module.unregister()
+    hdri_proxy.shutdown()
 
 if __name__ == "__main__":
     register()
\ No newline at end of file
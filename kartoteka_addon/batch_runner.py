@@ -0,0 +1,257 @@
+"""
+Фоновый пакетный рендер превью/иконок по папке .blend-файлов.
+
+Запуск (оркестратор):
+    blender -b -P kartoteka_addon/batch_runner.py -- --input D:/catalog --output D:/renders --workers 4
+
+Оркестратор раздаёт файлы пулу фоновых процессов Blender. Каждый воркер открывает
+свой .blend, включает аддон и вызывает operators.run_render_batch для всех мешей сцены.
+Число потоков рендера на воркер ограничено (render.threads), чтобы пул не
+перегружал CPU. Прогресс пишется в checkpoint-файл после каждого файла, поэтому
+прерванный запуск продолжается с того места, где остановился.
+
+Оркестратор можно запустить и обычным python, указав --blender.
+"""
+
+import argparse
+import importlib
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+try:
+    import bpy
+except ImportError:
+    bpy = None
+
+
+ADDON_DIR = os.path.dirname(os.path.abspath(__file__))
+ADDON_NAME = os.path.basename(ADDON_DIR)
+RESULT_MARKER = "KARTOTEKA_RESULT:"
+CHECKPOINT_NAME = "kartoteka_batch_checkpoint.json"
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Kartoteka: фоновый пакетный рендер превью и иконок")
+    parser.add_argument("--input", help="Папка с .blend-файлами")
+    parser.add_argument("--output", required=True, help="Папка для рендеров")
+    parser.add_argument("--outputs", choices=["PREVIEW", "ICON", "BOTH"], default="BOTH")
+    parser.add_argument("--by-object", action="store_true",
+                        help="Рендер каждого меша отдельно (по умолчанию — по верхним родителям)")
+    parser.add_argument("--derivatives", default="",
+                        help="Производные через запятую: размер:формат[:качество][:trim]")
+    parser.add_argument("--quality", choices=["SCENE", "DRAFT", "STANDARD", "FINAL"],
+                        help="Уровень качества рендера (по умолчанию — как сохранено в файле)")
+    parser.add_argument("--timing-log", default="",
+                        help="JSON-lines файл для замеров стадий рендера")
+    parser.add_argument("--force", action="store_true",
+                        help="Рендерить и неизменившиеся объекты (игнорировать манифест)")
+    parser.add_argument("--recursive", action="store_true", help="Искать .blend во вложенных папках")
+    parser.add_argument("--workers", type=int, default=0, help="Число процессов Blender (0 — авто)")
+    parser.add_argument("--threads", type=int, default=0, help="render.threads на воркер (0 — авто)")
+    parser.add_argument("--timeout", type=float, default=0, help="Таймаут на файл, сек (0 — без таймаута)")
+    parser.add_argument("--checkpoint", help="Файл прогресса (по умолчанию — в папке вывода)")
+    parser.add_argument("--blender", help="Путь к Blender (по умолчанию — текущий)")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def script_argv():
+    """Аргументы после '--' (blender -b -P script.py -- ...) или обычные аргументы python."""
+    if "--" in sys.argv:
+        return sys.argv[sys.argv.index("--") + 1:]
+    return sys.argv[1:]
+
+
+# --- Воркер (внутри фонового Blender с открытым .blend) ---
+
+def enable_addon():
+    """
+    Возвращает модуль аддона, включая его при необходимости.
+    Если аддон уже включён (в т.ч. как extension bl_ext.*.kartoteka_addon) — берём его.
+    """
+    import addon_utils
+
+    for name in bpy.context.preferences.addons.keys():
+        if name.split(".")[-1] == ADDON_NAME:
+            return importlib.import_module(name)
+
+    parent_dir = os.path.dirname(ADDON_DIR)
+    if parent_dir not in sys.path:
+        sys.path.insert(0, parent_dir)
+    addon_utils.enable(ADDON_NAME, default_set=True)
+    return importlib.import_module(ADDON_NAME)
+
+
+def run_worker(args):
+    addon = enable_addon()
+    operators = importlib.import_module(addon.__name__ + ".operators")
+    timings = importlib.import_module(addon.__name__ + ".timings")
+
+    scene = bpy.context.scene
+    if args.threads > 0:
+        scene.render.threads_mode = 'FIXED'
+        scene.render.threads = args.threads
+
+    scene.render_settings.save_path = args.output
+    if args.derivatives:
+        scene.render_settings.output_derivatives = args.derivatives
+    if args.quality:
+        scene.render_settings.quality_tier = args.quality
+    if args.timing_log:
+        scene.render_settings.timing_log_path = os.path.abspath(args.timing_log)
+
+    # Промежуточные файлы рендера пишутся во временную папку сессии процесса,
+    # так что воркеры не мешают друг другу и .blend не пересохраняется
+    timings.reset()
+    objs = [obj for obj in scene.objects if obj.type == 'MESH' and not obj.hide_render]
+    results = operators.run_render_batch(scene, objs, args.outputs, not args.by_object, args.force) if objs else []
+
+    print(f"[Worker] {timings.summary(limit=10)}")
+    print(RESULT_MARKER + json.dumps({"outputs": results}, ensure_ascii=False), flush=True)
+
+
+# --- Оркестратор ---
+
+def find_blend_files(input_dir, recursive=False):
+    blend_files = []
+    if recursive:
+        for root, _dirs, files in os.walk(input_dir):
+            blend_files.extend(os.path.join(root, f) for f in files if f.lower().endswith(".blend"))
+    else:
+        blend_files = [os.path.join(input_dir, f) for f in os.listdir(input_dir)
+                       if f.lower().endswith(".blend")]
+    return sorted(blend_files)
+
+
+def load_checkpoint(path):
+    if os.path.isfile(path):
+        try:
+            with open(path, 'r', encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"[BATCH] Не удалось прочитать checkpoint {path}: {e}")
+    return {"done": {}, "failed": {}}
+
+
+def save_checkpoint(path, checkpoint):
+    """Атомарная запись: при падении посередине старый checkpoint остаётся целым."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding="utf-8") as f:
+        json.dump(checkpoint, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def is_done(checkpoint, blend_path):
+    entry = checkpoint["done"].get(blend_path)
+    return bool(entry) and entry.get("mtime") == os.path.getmtime(blend_path)
+
+
+def render_blend_file(blender, blend_path, args, threads):
+    """Запускает фоновый Blender на одном файле. Возвращает (outputs, error)."""
+    output_dir = os.path.join(args.output, os.path.splitext(os.path.basename(blend_path))[0])
+    cmd = [
+        blender, "-b", blend_path,
+        "-P", os.path.abspath(__file__),
+        "--",
+        "--worker",
+        "--output", output_dir,
+        "--outputs", args.outputs,
+        "--threads", str(threads),
+    ]
+    if args.by_object:
+        cmd.append("--by-object")
+    if args.force:
+        cmd.append("--force")
+    if args.derivatives:
+        cmd.extend(["--derivatives", args.derivatives])
+    if args.quality:
+        cmd.extend(["--quality", args.quality])
+    if args.timing_log:
+        cmd.extend(["--timing-log", os.path.abspath(args.timing_log)])
+
+    try:
+        proc = subprocess.run(cmd, capture_output=True, text=True, encoding="utf-8", errors="replace",
+                              timeout=args.timeout or None)
+    except subprocess.TimeoutExpired:
+        return [], f"таймаут {args.timeout} с"
+
+    for line in proc.stdout.splitlines():
+        if line.startswith(RESULT_MARKER):
+            outputs = json.loads(line[len(RESULT_MARKER):])["outputs"]
+            errors = [error for _path, error, _skipped in outputs if error]
+            return outputs, "; ".join(errors) or None
+
+    tail = "\n".join((proc.stderr or proc.stdout).splitlines()[-5:])
+    return [], f"код выхода {proc.returncode}: {tail}"
+
+
+def run_pool(args):
+    blender = args.blender or (bpy.app.binary_path if bpy else None)
+    if not blender:
+        print("[BATCH] Не указан путь к Blender (--blender)")
+        return 1
+    if not args.input or not os.path.isdir(args.input):
+        print(f"[BATCH] Не найдена папка: {args.input}")
+        return 1
+
+    os.makedirs(args.output, exist_ok=True)
+    checkpoint_path = args.checkpoint or os.path.join(args.output, CHECKPOINT_NAME)
+    checkpoint = load_checkpoint(checkpoint_path)
+
+    blend_files = find_blend_files(args.input, args.recursive)
+    pending = [path for path in blend_files if not is_done(checkpoint, path)]
+    print(f"[BATCH] Файлов: {len(blend_files)}, уже готово: {len(blend_files) - len(pending)}, "
+          f"осталось: {len(pending)}")
+    if not pending:
+        return 0
+
+    cpu_count = os.cpu_count() or 1
+    workers = args.workers or max(1, min(len(pending), cpu_count // max(1, args.threads or 4)))
+    threads = args.threads or max(1, cpu_count // workers)
+    print(f"[BATCH] Воркеров: {workers}, потоков рендера на воркер: {threads}")
+
+    start = time.perf_counter()
+    failed_count = 0
+    pool = ThreadPoolExecutor(max_workers=workers)
+    try:
+        futures = {pool.submit(render_blend_file, blender, path, args, threads): path for path in pending}
+        for future in as_completed(futures):
+            path = futures[future]
+            outputs, error = future.result()
+            if error:
+                failed_count += 1
+                checkpoint["failed"][path] = {"error": error, "outputs": outputs}
+                print(f"[BATCH] ОШИБКА: {path} — {error}")
+            else:
+                checkpoint["failed"].pop(path, None)
+                checkpoint["done"][path] = {
+                    "mtime": os.path.getmtime(path),
+                    "outputs": [output_path for output_path, _error, _skipped in outputs],
+                }
+                print(f"[BATCH] OK: {path} ({len(outputs)} файлов)")
+            save_checkpoint(checkpoint_path, checkpoint)
+    except KeyboardInterrupt:
+        print("[BATCH] Прервано. Повторный запуск продолжит с checkpoint.")
+        pool.shutdown(wait=False, cancel_futures=True)
+        return 130
+    pool.shutdown()
+
+    print(f"[BATCH] Готово за {time.perf_counter() - start:.1f} с: "
+          f"{len(pending) - failed_count} успешно, {failed_count} с ошибками")
+    return 1 if failed_count else 0
+
+
+def main():
+    args = parse_args(script_argv())
+    if args.worker:
+        run_worker(args)
+        return 0
+    return run_pool(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
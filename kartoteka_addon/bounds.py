@@ -0,0 +1,110 @@
+import bpy
+import numpy as np
+from bpy.app.handlers import persistent
+
+
+# Габариты объектов в мировых координатах.
+# Углы bound_box всех объектов переводятся в мир одним матричным умножением NumPy,
+# результат кэшируется по объекту и сбрасывается, когда depsgraph сообщает
+# об изменении его трансформа или геометрии (а также после загрузки файла и undo/redo).
+# Записи удалённых объектов вычищаются, когда кэш становится больше числа объектов в файле.
+
+_cache = {}  # (as_pointer, имя) -> углы в мире, массив (8, 3)
+
+
+def _key(obj):
+    return obj.as_pointer(), obj.name
+
+
+def _world_corners(objects):
+    local = np.array([obj.bound_box for obj in objects], dtype=np.float64)           # (M, 8, 3)
+    matrices = np.array([obj.matrix_world for obj in objects], dtype=np.float64)     # (M, 4, 4)
+    return np.einsum('mij,mkj->mki', matrices[:, :3, :3], local) + matrices[:, None, :3, 3]
+
+
+def _prune():
+    """Убирает из кэша записи объектов, которых больше нет в файле."""
+    alive = {_key(obj) for obj in bpy.data.objects}
+    for key in [key for key in _cache if key not in alive]:
+        del _cache[key]
+
+
+def objects_corners(objects, use_cache=True):
+    """
+    Углы bound_box объектов в мировых координатах: массив (N, 8, 3).
+    use_cache=False — посчитать заново и не запоминать (для временных объектов).
+    """
+    objects = list(objects)
+    if not objects:
+        return np.empty((0, 8, 3))
+    if not use_cache:
+        return _world_corners(objects)
+
+    missing = [obj for obj in objects if _key(obj) not in _cache]
+    if missing:
+        for obj, corners in zip(missing, _world_corners(missing)):
+            _cache[_key(obj)] = corners
+        if len(_cache) > len(bpy.data.objects):
+            _prune()
+
+    return np.stack([_cache[_key(obj)] for obj in objects])
+
+
+def object_corners(obj, use_cache=True):
+    """Углы bound_box одного объекта в мировых координатах: массив (8, 3)."""
+    return objects_corners([obj], use_cache)[0]
+
+
+def objects_aabb(objects):
+    """Общий AABB объектов: (min, max) — массивы (3,), или None для пустого списка."""
+    corners = objects_corners(objects)
+    if not len(corners):
+        return None
+    flat = corners.reshape(-1, 3)
+    return flat.min(axis=0), flat.max(axis=0)
+
+
+def invalidate(obj=None):
+    """Сбрасывает кэш объекта (или весь кэш, если obj не задан)."""
+    if obj is None:
+        _cache.clear()
+    else:
+        _cache.pop(_key(obj), None)
+
+
+@persistent
+def _on_depsgraph_update(scene, depsgraph):
+    if not _cache:
+        return
+    for update in depsgraph.updates:
+        if not isinstance(update.id, bpy.types.Object):
+            continue
+        if update.is_updated_transform or update.is_updated_geometry:
+            invalidate(update.id.original)
+
+
+@persistent
+def _on_reset(*args):
+    # После загрузки файла и undo/redo указатели объектов недействительны
+    invalidate()
+
+
+_handlers = (
+    (bpy.app.handlers.depsgraph_update_post, _on_depsgraph_update),
+    (bpy.app.handlers.load_post, _on_reset),
+    (bpy.app.handlers.undo_post, _on_reset),
+    (bpy.app.handlers.redo_post, _on_reset),
+)
+
+
+def register():
+    for handlers, handler in _handlers:
+        if handler not in handlers:
+            handlers.append(handler)
+
+
+def unregister():
+    for handlers, handler in _handlers:
+        if handler in handlers:
+            handlers.remove(handler)
+    invalidate()
@@ -1,31 +1,19 @@
 import bpy
 import math
 import mathutils
+from bpy_extras.object_utils import world_to_camera_view
+from .bounds import objects_aabb, objects_corners
 
 
 def calculate_objects_bounds(objects):
-    all_coords = []
-    for obj in objects:
-        # Берём координаты bound_box в мировых координатах
-        bbox_coords = [obj.matrix_world @ mathutils.Vector(corner) for corner in obj.bound_box]
-        all_coords.extend(bbox_coords)
-
-    if not all_coords:
+    # Общий габарит в мировых координатах — одним векторным проходом (см. bounds)
+    aabb = objects_aabb(objects)
+    if aabb is None:
         return mathutils.Vector((0, 0, 0)), 0
 
-    x_min = min(v.x for v in all_coords)
-    x_max = max(v.x for v in all_coords)
-    y_min = min(v.y for v in all_coords)
-    y_max = max(v.y for v in all_coords)
-    z_min = min(v.z for v in all_coords)
-    z_max = max(v.z for v in all_coords)
-
-    center = mathutils.Vector((
-        (x_min + x_max) / 2.0,
-        (y_min + y_max) / 2.0,
-        (z_min + z_max) / 2.0
-    ))
-    size = max(x_max - x_min, y_max - y_min, z_max - z_min)
+    bounds_min, bounds_max = aabb
+    center = mathutils.Vector((bounds_min + bounds_max) / 2.0)
+    size = float((bounds_max - bounds_min).max())
     return center, size
 
 
@@ -36,27 +24,95 @@ def look_at(cam_obj, target):
     cam_obj.rotation_euler = quat.to_euler()
 
 
-def setup_camera(scene, center, size, side='GENERAL', camera_dist=2.5, focus_obj=None):
-    # Удаляем старую камеру Preview_Camera, если есть
-    for o in bpy.data.objects:
-        if o.type == 'CAMERA' and o.name.startswith("Preview_Camera"):
-            bpy.data.objects.remove(o, do_unlink=True)
-
-    # Создаём новую камеру
-    cam_data = bpy.data.cameras.new("Preview_Camera")
-    cam_obj = bpy.data.objects.new("Preview_Camera", cam_data)
-    scene.collection.objects.link(cam_obj)
+# Угол камеры вокруг объекта (по Z, в градусах) для каждой стороны
+CAMERA_SIDE_ANGLES = {
+    'GENERAL': -90.0,
+    'LEFT': 230.0,
+    'RIGHT': -50.0,
+}
+
+
+RIG_COLLECTION = "Kartoteka_Preview_Rig"
+RIG_CAMERA = "Preview_Camera"
+
+# Подсветка рига: (имя, смещение от камеры в долях дистанции (x вправо, y вверх, z назад), мощность)
+RIG_LIGHTS = (
+    ("Preview_Key_Light", (-0.6, 0.5, 0.0), 1.0),
+    ("Preview_Fill_Light", (0.7, 0.1, 0.1), 0.35),
+)
+
+
+def _set(struct, attr, value):
+    # Присваивание только при изменении: лишние записи будят depsgraph
+    if getattr(struct, attr) != value:
+        setattr(struct, attr, value)
+
+
+def get_preview_rig(scene):
+    """
+    Постоянный риг превью: камера и подсветка в скрытой коллекции RIG_COLLECTION.
+    Создаётся один раз на сцену, дальше только переиспользуется.
+    Возвращает (камера, [источники света]).
+    """
+    collection = bpy.data.collections.get(RIG_COLLECTION)
+    if collection is None:
+        collection = bpy.data.collections.new(RIG_COLLECTION)
+        collection.hide_viewport = True
+        collection.hide_select = True
+    if collection.name not in scene.collection.children:
+        scene.collection.children.link(collection)
+        # Слой скайбокса рендерит только мир — риг ему не нужен
+        skybox_layer = scene.view_layers.get("Skybox_Layer")
+        if skybox_layer:
+            skybox_layer.layer_collection.children[collection.name].exclude = True
+
+    cam_obj = collection.objects.get(RIG_CAMERA)
+    if cam_obj is None or cam_obj.type != 'CAMERA':
+        _remove_legacy_cameras()
+        cam_obj = bpy.data.objects.new(RIG_CAMERA, bpy.data.cameras.new(RIG_CAMERA))
+        collection.objects.link(cam_obj)
+
+    lights = []
+    for name, _offset, _power in RIG_LIGHTS:
+        light_obj = collection.objects.get(name)
+        if light_obj is None or light_obj.type != 'LIGHT':
+            light_data = bpy.data.lights.new(name, 'AREA')
+            light_data.shape = 'DISK'
+            light_obj = bpy.data.objects.new(name, light_data)
+            light_obj.visible_camera = False
+            light_obj.parent = cam_obj  # Свет едет вместе с камерой, трансформ обновляется один раз
+            collection.objects.link(light_obj)
+        lights.append(light_obj)
+
+    return cam_obj, lights
+
+
+def _remove_legacy_cameras():
+    """Убирает камеры Preview_Camera*, которые раньше создавались на каждый рендер, и их осиротевшие данные."""
+    for obj in [o for o in bpy.data.objects if o.type == 'CAMERA' and o.name.startswith(RIG_CAMERA)]:
+        bpy.data.objects.remove(obj, do_unlink=True)
+    for cam_data in [c for c in bpy.data.cameras if c.name.startswith(RIG_CAMERA) and c.users == 0]:
+        bpy.data.cameras.remove(cam_data)
+
+
+def setup_camera(scene, center, size, side='GENERAL', camera_dist=2.5, focus_obj=None, angle=None,
+                 lens=50.0, fill_lights=False, light_power=1.0):
+    """
+    Ставит камеру постоянного рига на объект: меняются только трансформ, объектив и DOF.
+    angle (градусы) — произвольный угол вокруг объекта вместо стороны side (для поворотного стола).
+    fill_lights — включить подсветку рига (light_power — множитель мощности).
+    """
+    cam_obj, lights = get_preview_rig(scene)
+    cam_data = cam_obj.data
 
     # Рассчитываем расстояние, с которого будем смотреть на bounding box
     dist = size * camera_dist
 
     # Выбираем угол в зависимости от параметра side
-    if side == 'LEFT':
-        angle_deg = 230.0
-    elif side == 'RIGHT':
-        angle_deg = -50.0
-    else:  # GENERAL
-        angle_deg = -90.0
+    if angle is not None:
+        angle_deg = angle
+    else:
+        angle_deg = CAMERA_SIDE_ANGLES.get(side, CAMERA_SIDE_ANGLES['GENERAL'])
 
     angle_rad = math.radians(angle_deg)
     cam_x = center.x + dist * math.cos(angle_rad)
@@ -68,10 +124,59 @@ def setup_camera(scene, center, size, side='GENERAL', camera_dist=2.5, focus_obj
     # Поворачиваем камеру, чтобы –Z смотрел на центр
     look_at(cam_obj, center)
 
+    _set(cam_data, "lens", lens)
+
     # Настраиваем DOF
-    cam_data.dof.use_dof = True
-    cam_data.dof.focus_object = focus_obj  # Если хотим фокусироваться на активном объекте
+    _set(cam_data.dof, "use_dof", True)
+    _set(cam_data.dof, "focus_object", focus_obj)  # Фокус на активном объекте
+
+    # Подсветка: смещения и мощность масштабируются с дистанцией, чтобы освещённость не зависела от размера
+    for light_obj, (_name, offset, power) in zip(lights, RIG_LIGHTS):
+        _set(light_obj, "hide_render", not fill_lights)
+        if not fill_lights:
+            continue
+        light_obj.location = mathutils.Vector(offset) * dist
+        _set(light_obj.data, "size", max(size, 0.01))
+        _set(light_obj.data, "energy", 100.0 * power * light_power * max(dist, 0.01) ** 2)
 
     # Делаем камеру активной
-    scene.camera = cam_obj
+    if scene.camera != cam_obj:
+        scene.camera = cam_obj
+
+    # matrix_world обновляется только при вычислении depsgraph: без этого рамка рендера
+    # и ключ кэша фона считались бы по камере предыдущего объекта
+    cam_obj.matrix_world = mathutils.Matrix.LocRotScale(cam_obj.location, cam_obj.rotation_euler, cam_obj.scale)
+    update_rig_view_layer(scene, cam_obj)
     return cam_obj
+
+
+def update_rig_view_layer(scene, cam_obj):
+    """Вычисляет depsgraph слоя, в котором есть камера рига (свет, фокус, матрицы)."""
+    for view_layer in scene.view_layers:
+        if view_layer.objects.get(cam_obj.name) is not None:
+            view_layer.update()
+            return
+
+
+def projected_border(scene, cam_obj, objects, margin=0.03):
+    """
+    Прямоугольник кадра (min_x, max_x, min_y, max_y в долях 0..1), куда проецируются
+    габариты objects с камеры cam_obj, расширенный на margin (доля кадра) с каждой стороны.
+    None — если часть габарита за камерой или прямоугольник занимает весь кадр.
+    """
+    xs, ys = [], []
+    for corner in objects_corners(objects).reshape(-1, 3):
+        co = world_to_camera_view(scene, cam_obj, mathutils.Vector(corner))
+        if co.z <= 0.0:
+            return None
+        xs.append(co.x)
+        ys.append(co.y)
+
+    if not xs:
+        return None
+
+    border = (max(0.0, min(xs) - margin), min(1.0, max(xs) + margin),
+              max(0.0, min(ys) - margin), min(1.0, max(ys) + margin))
+    if border[0] >= border[1] or border[2] >= border[3] or border == (0.0, 1.0, 0.0, 1.0):
+        return None
+    return border
@@ -1,15 +1,113 @@
 import bpy
+import os
+import shutil
 
 from .node_utils import (
-    get_or_create_node,
-    ensure_link
+    reconcile_graph,
+    set_if_changed
 )
+from .render_utils import border_region, get_session_dir, render_request, set_active_view_layer
+from . import image_pool, live_update, skybox_cache, timings
+
+
+# Графы композитинга в декларативном виде (см. node_utils.reconcile_graph).
+# Повторные вызовы меняют дерево только там, где оно расходится с описанием.
+
+def _render_layers(layer, location):
+    return {"type": 'RENDER_LAYERS', "location": location, "props": {"layer": layer}}
+
+
+OUTPUT_NODES = {
+    "Viewer": {"type": 'VIEWER', "location": (200, 200)},
+    "Composite": {"type": 'COMPOSITE', "location": (200, 0)},
+}
+
+ICON_GRAPH = {
+    "nodes": {
+        "Render_Layers_View": _render_layers("ViewLayer", (-800, 200)),
+        **OUTPUT_NODES,
+    },
+    "links": [
+        ("Render_Layers_View", "Image", "Viewer", "Image"),
+        ("Render_Layers_View", "Image", "Composite", "Image"),
+    ],
+}
+
+# Двухпроходное превью: одни и те же ноды, на каждом проходе — свои линки
+LEGACY_PREVIEW_NODES = {
+    "Render_Layers_View": _render_layers("ViewLayer", (-800, 200)),
+    "Render_Layers_Skybox": _render_layers("Skybox_Layer", (-800, -100)),
+    "node_cod_image": {"type": 'IMAGE', "location": (-800, -400)},
+    "Blur": {"type": 'BLUR', "location": (-500, -100), "props": {"use_relative": False, "size_x": 100, "size_y": 100}},
+    "Alpha_Over_1": {"type": 'ALPHA_OVER', "location": (-200, 100), "inputs": {"Fac": 1.0}},
+    **OUTPUT_NODES,
+}
+
+LEGACY_PREVIEW_GRAPH = {
+    "nodes": LEGACY_PREVIEW_NODES,
+    "links": [
+        ("Render_Layers_Skybox", "Image", "Blur", "Image"),
+    ],
+}
+
+LEGACY_OBJECT_PASS = {
+    "nodes": LEGACY_PREVIEW_NODES,
+    "links": [
+        ("Render_Layers_View", "Image", "Viewer", "Image"),
+        ("Render_Layers_View", "Image", "Composite", "Image"),
+    ],
+}
+
+LEGACY_SKYBOX_PASS = {
+    "nodes": LEGACY_PREVIEW_NODES,
+    "links": [
+        ("Render_Layers_Skybox", "Image", "Blur", "Image"),
+        ("Blur", "Image", "Alpha_Over_1", 1),
+        ("node_cod_image", "Image", "Alpha_Over_1", 2),
+        ("Alpha_Over_1", "Image", "Viewer", "Image"),
+        ("Alpha_Over_1", "Image", "Composite", "Image"),
+    ],
+}
+
+# Превью за один рендер; источник фона переключает route_preview_background
+SINGLE_PASS_GRAPH = {
+    "nodes": {
+        "Render_Layers_View": _render_layers("ViewLayer", (-800, 200)),
+        "Render_Layers_Skybox": _render_layers("Skybox_Layer", (-800, -100)),
+        "Blur": {"type": 'BLUR', "location": (-500, -100), "props": {"use_relative": False, "size_x": 100, "size_y": 100}},
+        "Alpha_Over_1": {"type": 'ALPHA_OVER', "location": (-200, 100), "inputs": {"Fac": 1.0}},
+        "Skybox_Cached": {"type": 'IMAGE', "location": (-500, -350)},
+        "Skybox_Capture": {"type": 'OUTPUT_FILE', "location": (-200, -350), "props": {"mute": True}},
+        **OUTPUT_NODES,
+    },
+    "links": [
+        ("Render_Layers_Skybox", "Env", "Blur", "Image"),
+        ("Blur", "Image", "Alpha_Over_1", 1),
+        ("Render_Layers_View", "Image", "Alpha_Over_1", 2),
+        ("Alpha_Over_1", "Image", "Viewer", "Image"),
+        ("Alpha_Over_1", "Image", "Composite", "Image"),
+    ],
+}
+
+
+def apply_graph(spec, label):
+    """Включает ноды композитинга сцены и приводит граф к spec."""
+    scene = bpy.context.scene
+    if not scene.use_nodes:
+        scene.use_nodes = True
+        print("[INFO] Compositing: 'Use Nodes' включён.")
+
+    changes = reconcile_graph(scene.node_tree, spec)
+    if changes:
+        print(f"[INFO] Compositing ({label}): изменений в графе — {changes}.")
+    return scene.node_tree
 
 
 def setup_preview_settings(obj, blur=1.0):
     scene = bpy.context.scene
     scene.render.film_transparent = True
-    scene.render.filepath = "//object.png"
+    # Промежуточный файл — во временной папке сессии: .blend не нужно сохранять
+    scene.render.filepath = os.path.join(get_session_dir(), "object.png")
 
     layer_name = "ViewLayer"
     if layer_name not in scene.view_layers:
@@ -17,52 +115,29 @@ def setup_preview_settings(obj, blur=1.0):
         return
 
     # Активируем нужный ViewLayer
-    bpy.context.window.view_layer = scene.view_layers[layer_name]
-
-    # А теперь правим ноды: очищаем все links и подключаем только объект
-    if not scene.use_nodes:
-        scene.use_nodes = True
-
-    node_tree = scene.node_tree
-    nodes = node_tree.nodes
-    links = node_tree.links
-
-    # Удаляем существующие связи (не трогаем сами узлы)
-    for link in list(links):
-        links.remove(link)
+    set_active_view_layer(layer_name)
 
-    # RENDER_LAYERS для объекта:
-    node_obj = get_or_create_node(node_tree, 'RENDER_LAYERS', name="Render_Layers_View")
-    node_obj.layer = "ViewLayer"
-
-    # Composite + Viewer
-    node_view = get_or_create_node(node_tree, 'VIEWER', name="Viewer")
-    node_comp = get_or_create_node(node_tree, 'COMPOSITE', name="Composite")
-
-    # Связываем: Object → Composite/Viewer
-    ensure_link(links, node_obj, "Image", node_view, "Image")
-    ensure_link(links, node_obj, "Image", node_comp, "Image")
+    # Подключаем к выходу только объект
+    node_tree = apply_graph(LEGACY_OBJECT_PASS, "preview, object pass")
 
     print(f"[INFO] Рендерим объект (ViewLayer) на прозрачном фоне -> {scene.render.filepath}")
 
-    # Блокирующий рендер
-    bpy.ops.render.render("EXEC_DEFAULT", write_still=True)
+    with timings.stage("render:object"):
+        yield render_request()
     print("[INFO] Первый рендер (объект) завершён.")
 
-    image_path = bpy.path.abspath(scene.render.filepath)  # Преобразуем "//object.png" в абсолютный путь
-
-    # Создаём/находим Image-ноду
-    node_cod_image = get_or_create_node(node_tree, 'IMAGE', name="node_cod_image")
+    image_path = scene.render.filepath
 
-    loaded_img = bpy.data.images.load(image_path)  # Проверка на сохранения проекта
-    node_cod_image.image = loaded_img
+    # Один и тот же datablock на все превью: перезаписанный object.png перечитывается на месте
+    with timings.stage("image_reload"):
+        set_if_changed(node_tree.nodes["node_cod_image"], "image", image_pool.acquire(image_path))
 
 
 def setup_preview_settings_last_first_render(compositing_blur):
     scene = bpy.context.scene
 
     scene.render.film_transparent = False
-    scene.render.filepath = "//skybox.png"
+    scene.render.filepath = os.path.join(get_session_dir(), "skybox.png")
 
     layer_name = "Skybox_Layer"
     if layer_name not in scene.view_layers:
@@ -70,58 +145,23 @@ def setup_preview_settings_last_first_render(compositing_blur):
         return
 
     # Активируем Skybox-слой
-    bpy.context.window.view_layer = scene.view_layers[layer_name]
+    set_active_view_layer(layer_name)
 
-    # Чтобы при рендере захватить наши новые ноды:
-    if not scene.use_nodes:
-        scene.use_nodes = True
-
-    node_tree = scene.node_tree
-    nodes = node_tree.nodes
-    links = node_tree.links
-
-    # Удаляем старые связи
-    for link in list(links):
-        links.remove(link)
-
-    # Создаём/ищем RenderLayers для Skybox и для объекта (если хотите его альфа-оверить поверх)
-    node_sky = get_or_create_node(node_tree, 'RENDER_LAYERS', name="Render_Layers_Skybox")
-    node_sky.layer = "Skybox_Layer"
-
-    node_cod_image = get_or_create_node(node_tree, 'IMAGE', name="node_cod_image")
-
-    node_obj = get_or_create_node(node_tree, 'RENDER_LAYERS', name="Render_Layers_View")
-    node_obj.layer = "ViewLayer"
-
-    node_blur = next((node for node in nodes if node.name == "Blur"), None)
-
-    node_alpha_over_1 = get_or_create_node(
-        node_tree, 'CompositorNodeAlphaOver',
-        name="Alpha_Over_1",
-        location=(-500, 100)
-    )
-    node_alpha_over_1.inputs["Fac"].default_value = 1.0  # или 0.0 — смотря как хотите
-
-    node_view = get_or_create_node(node_tree, 'VIEWER', name="Viewer")
-    node_comp = get_or_create_node(node_tree, 'COMPOSITE', name="Composite")
-
-    ensure_link(links, node_sky, "Image", node_blur, "Image")
-    ensure_link(links, node_cod_image, "Image", node_alpha_over_1, node_alpha_over_1.inputs[2].identifier)
-    ensure_link(links, node_blur, "Image", node_alpha_over_1, node_alpha_over_1.inputs[1].identifier)
-    ensure_link(links, node_alpha_over_1, "Image", node_view, "Image")
-    ensure_link(links, node_alpha_over_1, "Image", node_comp, "Image")
+    # Фон из Skybox_Layer через Blur, поверх — объект из первого прохода
+    apply_graph(LEGACY_SKYBOX_PASS, "preview, skybox pass")
 
     set_blur_size(compositing_blur)
 
-    bpy.ops.render.render("EXEC_DEFAULT", write_still=True)
+    with timings.stage("render:skybox"):
+        yield render_request()
 
-    bpy.context.window.view_layer = bpy.context.scene.view_layers["ViewLayer"]
+    set_active_view_layer("ViewLayer")
 
 
-def setup_icon_settings(obj):
+def setup_icon_settings(obj, output_path, file_format='PNG'):
     """
     Для иконки рендерим один слой (ViewLayer) с прозрачностью
-    или без — на ваше усмотрение.
+    и пишем результат рендером сразу в output_path (одно кодирование).
     """
     scene = bpy.context.scene
 
@@ -132,10 +172,9 @@ def setup_icon_settings(obj):
     if layer_name not in scene.view_layers:
         return
 
-    bpy.context.window.view_layer = scene.view_layers[layer_name]
+    set_active_view_layer(layer_name)
 
-    # Блокирующий рендер
-    bpy.ops.render.render("EXEC_DEFAULT", write_still=True)
+    yield from render_to_file(output_path, file_format, 'RGBA', label="icon")
 
 
 def setup_compositing_nodes_for_icon():
@@ -143,85 +182,150 @@ def setup_compositing_nodes_for_icon():
     Простейший сетап композитинга для иконки:
     один Render Layers -> Composite -> Viewer.
     """
-    scene = bpy.context.scene
-
-    if not scene.use_nodes:
-        scene.use_nodes = True
-        print("[INFO] Compositing: 'Use Nodes' включён.")
+    apply_graph(ICON_GRAPH, "icon")
 
-    node_tree = scene.node_tree
-    nodes = node_tree.nodes
-    links = node_tree.links
 
-    nodes.clear()
+def setup_compositing_nodes_for_preview():
+    """
+    Граф двухпроходного превью: ViewLayer + Skybox_Layer + Blur + Alpha Over.
+    Линки под каждый проход выставляют setup_preview_settings
+    и setup_preview_settings_last_first_render.
+    """
+    apply_graph(LEGACY_PREVIEW_GRAPH, "preview")
 
-    node_render_view_layer = get_or_create_node(node_tree, 'RENDER_LAYERS', location=(-800, 200))
-    node_render_view_layer.layer = "ViewLayer"
 
-    node_view = get_or_create_node(node_tree, 'VIEWER', location=(200, 200))
-    node_composite = get_or_create_node(node_tree, 'COMPOSITE', location=(200, 0))
+def setup_compositing_nodes_for_single_pass_preview():
+    """
+    Превью за один рендер, без промежуточных object.png/skybox.png.
+    ViewLayer (объект на прозрачном фоне) и Skybox_Layer рендерятся одним вызовом.
+    Фон берётся из прохода Environment слоя Skybox_Layer — он содержит мир
+    и при включённой прозрачности плёнки — и сводится в памяти:
+    Env -> Blur -> Alpha Over <- объект -> Composite/Viewer.
+    """
+    scene = bpy.context.scene
 
-    ensure_link(links, node_render_view_layer, "Image", node_view, "Image")
-    ensure_link(links, node_render_view_layer, "Image", node_composite, "Image")
+    for layer_name in ("ViewLayer", "Skybox_Layer"):
+        set_if_changed(scene.view_layers[layer_name], "use", True)
+    set_if_changed(scene.view_layers["Skybox_Layer"], "use_pass_environment", True)
 
-    print("[INFO] Compositing (icon): ноды созданы и связаны.")
+    apply_graph(SINGLE_PASS_GRAPH, "single-pass preview")
 
 
-def setup_compositing_nodes_for_preview():
+def route_preview_background(cached_image=None, capture_key=None):
     """
-    Старый пример, если хотите одним махом собрать
-    ViewLayer + Skybox_Layer + Blur + ещё что-то.
-
-    Но мы не используем его напрямую, раз хотим
-    два прохода рендера и попеременное переключение.
+    Выбирает источник фона для single-pass превью.
+    cached_image — готовый размытый фон из кэша: Skybox_Layer выключается и не рендерится.
+    Иначе фон идёт из Env -> Blur; если задан capture_key, размытый фон
+    дополнительно пишется нодом File Output в кэш в том же рендере.
     """
     scene = bpy.context.scene
+    node_tree = scene.node_tree
 
-    if not scene.use_nodes:
-        scene.use_nodes = True
-        print("[INFO] Compositing: 'Use Nodes' включён.")
+    nodes = {
+        "Skybox_Cached": {"type": 'IMAGE', "location": (-500, -350)},
+        "Skybox_Capture": {"type": 'OUTPUT_FILE', "location": (-200, -350), "props": {"mute": not capture_key}},
+    }
+    if cached_image is not None:
+        nodes["Skybox_Cached"]["props"] = {"image": cached_image}
 
-    node_tree = scene.node_tree
-    nodes = node_tree.nodes
-    links = node_tree.links
+    reconcile_graph(node_tree, {
+        "nodes": nodes,
+        "links": [
+            ("Skybox_Cached" if cached_image is not None else "Blur", "Image", "Alpha_Over_1", 1),
+            ("Blur", "Image", "Skybox_Capture", 0) if capture_key else (None, None, "Skybox_Capture", 0),
+        ],
+    }, exclusive=False)
+
+    set_if_changed(scene.view_layers["Skybox_Layer"], "use", cached_image is None)
+
+    if capture_key:
+        node_capture = node_tree.nodes["Skybox_Capture"]
+        set_if_changed(node_capture, "base_path", skybox_cache.get_cache_dir())
+        set_if_changed(node_capture, "format.file_format", 'OPEN_EXR')
+        set_if_changed(node_capture, "format.color_depth", '16')
+        set_if_changed(node_capture.file_slots[0], "path", skybox_cache.capture_slot_path(capture_key))
+
+
+def render_to_file(output_path, file_format, color_mode, label="render"):
+    """
+    Рендер с записью результата напрямую в output_path (write_still), без save_render.
+    PNG пишется без сжатия: такой файл — промежуточный буфер для output_encoder.
+    Глубина — 8 бит (как у save_render для превью), какой бы ни была в сцене.
+    write_still подставляет номер кадра вместо '#', поэтому путь с '#' рендерится
+    во временный файл сессии и переносится на место.
+    filepath и формат вывода сцены восстанавливаются после рендера.
+    """
+    render = bpy.context.scene.render
+    image_settings = render.image_settings
+    write_path = output_path
+    if "#" in output_path:
+        write_path = os.path.join(get_session_dir(), f"render_{label}{os.path.splitext(output_path)[1]}")
+
+    previous = (render.filepath, image_settings.file_format, image_settings.color_mode,
+                image_settings.color_depth, image_settings.compression)
+    render.filepath = write_path
+    image_settings.file_format = file_format
+    image_settings.color_mode = color_mode
+    image_settings.color_depth = '8'
+    if file_format == 'PNG':
+        image_settings.compression = 0
+
+    try:
+        with timings.stage(f"render:{label}"):
+            yield render_request()
+    finally:
+        (render.filepath, image_settings.file_format, image_settings.color_mode,
+         image_settings.color_depth, image_settings.compression) = previous
+    if write_path != output_path:
+        shutil.move(write_path, output_path)
+
+
+def render_single_pass_preview(compositing_blur, output_path, use_cache=False, cache_size_mb=512,
+                               file_format='JPEG', border=None):
+    """
+    Один рендер обоих слоёв с записью итогового JPEG (или file_format) напрямую
+    в output_path — одно кодирование, без повторного save_render.
+    С use_cache размытый фон берётся из skybox_cache, если ключ совпал,
+    и тогда рендерится только ViewLayer — в пределах border, если он задан
+    (фон на весь кадр даёт кэш). Без кэша нужен полный кадр скайбокса, border не применяется.
+    """
+    scene = bpy.context.scene
+    render = scene.render
 
-    nodes.clear()
+    previous_single_layer = render.use_single_layer
+    render.film_transparent = True
+    render.use_single_layer = False
+    set_blur_size(compositing_blur)
 
-    node_render_view_layer = get_or_create_node(
-        node_tree, 'RENDER_LAYERS',
-        name="Render_Layers_View", location=(-800, 200)
-    )
-    node_render_skybox_layer = get_or_create_node(
-        node_tree, 'RENDER_LAYERS',
-        name="Render_Layers_Skybox", location=(-800, -100)
-    )
+    with timings.stage("skybox_cache"):
+        key = skybox_cache.background_key(scene, compositing_blur) if use_cache else None
+        cached_image = skybox_cache.get_background(key) if key else None
+        route_preview_background(cached_image, capture_key=key if cached_image is None else None)
 
-    node_render_view_layer.layer = "ViewLayer"
-    node_render_skybox_layer.layer = "Skybox_Layer"
+    try:
+        with border_region(scene, border if cached_image is not None else None):
+            yield from render_to_file(output_path, file_format, 'RGB' if file_format == 'JPEG' else 'RGBA',
+                                      label="single_pass")
+    finally:
+        scene.view_layers["Skybox_Layer"].use = True
+        render.use_single_layer = previous_single_layer
 
-    node_blur = get_or_create_node(node_tree, 'BLUR', location=(-500, 100))
-    node_blur.use_relative = False
-    node_blur.size_x = 100
-    node_blur.size_y = 100
+    if key and cached_image is None:
+        with timings.stage("skybox_cache"):
+            skybox_cache.store_background(scene, key, cache_size_mb * 1024 * 1024)
 
-    node_alpha_over_1 = get_or_create_node(
-        node_tree, 'CompositorNodeAlphaOver',
-        name="Alpha_Over_1",
-        location=(-500, 100)
-    )
-    node_alpha_over_1.inputs["Fac"].default_value = 0.0
+    print(f"[INFO] Превью (один проход) записано: {output_path}")
 
-    node_view = get_or_create_node(node_tree, 'VIEWER', location=(200, 200))
-    node_composite = get_or_create_node(node_tree, 'COMPOSITE', location=(200, 0))
 
-    # Примерная связка (не обязательно рабочая «из коробки»):
-    # ensure_link(links, node_render_view_layer, "Image", node_alpha_over_1, node_alpha_over_1.inputs[2].identifier)
-    ensure_link(links, node_render_skybox_layer, "Image", node_blur, "Image")
+def _apply_compositing_blur():
+    scene = bpy.context.scene
+    if scene.node_tree and scene.node_tree.nodes.get("Blur"):
+        set_blur_size(scene.render_settings.compositing_blur)
 
-    # ensure_link(links, node_blur, "Image", node_alpha_over_1, node_alpha_over_1.inputs[1].identifier)
-    # ensure_link(links, node_cod_image, "Image", node_alpha_over_1, node_alpha_over_1.inputs[2].identifier)
 
-    print("[INFO] Compositing (preview): ноды созданы и связаны.")
+def update_compositing_blur(self, context):
+    """Живой предпросмотр размытия в композиторе (если граф уже собран), не чаще раза за кадр."""
+    live_update.schedule("compositing_blur", _apply_compositing_blur)
 
 
 def set_blur_size(value):
@@ -230,10 +334,12 @@ def set_blur_size(value):
     """
     scene = bpy.context.scene
     node_tree = scene.node_tree
-    node_blur = next((node for node in node_tree.nodes if node.type == 'BLUR'), None)
+    node_blur = node_tree.nodes.get("Blur")
+    if node_blur is None or node_blur.type != 'BLUR':
+        node_blur = next((node for node in node_tree.nodes if node.type == 'BLUR'), None)
 
     if node_blur:
-        node_blur.inputs["Size"].default_value = value
-        print(f"[INFO] Blur size установлен в {value}")
+        if set_if_changed(node_blur.inputs["Size"], "default_value", value):
+            print(f"[INFO] Blur size установлен в {value}")
     else:
         print("[WARNING] BLUR-нод не найден в node_tree!")
@@ -0,0 +1,323 @@
+import bpy
+import bpy.utils.previews
+import hashlib
+import os
+import struct
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from . import hdri_proxy
+
+try:
+    import OpenImageIO as oiio
+except ImportError:
+    oiio = None
+
+
+# Индекс библиотеки HDRI из папки assets.
+# Список файлов и метаданные (разрешение, формат, размер) строятся один раз и
+# перестраиваются, только когда меняется mtime папки; метаданные неизменившихся
+# файлов переиспользуются. Миниатюры считаются в фоновом потоке (через OpenImageIO,
+# если он есть в сборке Blender) и кэшируются на диске; в главном потоке таймер
+# только подгружает готовые маленькие PNG в коллекцию превью. Прокси HDRI ставятся
+# в очередь там же — при перестройке индекса, а не при каждой настройке мира.
+
+EXTENSIONS = (".hdr", ".exr", ".png", ".jpg", ".jpeg")
+THUMB_SIZE = 128
+THUMB_DIR_NAME = "kartoteka_hdri_thumbs"
+
+_index = {"dir": None, "mtime": None, "entries": {}, "items": []}
+_previews = {"collection": None}
+_thumbs = {"executor": None, "pending": {}}  # имя файла -> Future
+
+
+def get_assets_dir():
+    return os.path.join(os.path.dirname(__file__), "assets")
+
+
+# --- Метаданные без загрузки картинки в Blender ---
+
+def _read_hdr_size(f):
+    # Radiance: текстовый заголовок, пустая строка, затем "-Y <высота> +X <ширина>"
+    for _ in range(64):
+        line = f.readline()
+        if not line:
+            return None
+        if line.strip() == b"":
+            parts = f.readline().split()
+            if len(parts) == 4:
+                return int(parts[3]), int(parts[1])
+            return None
+    return None
+
+
+def _read_cstring(f, limit=256):
+    chars = bytearray()
+    while len(chars) < limit:
+        char = f.read(1)
+        if char in (b"", b"\0"):
+            break
+        chars += char
+    return bytes(chars)
+
+
+def _read_exr_size(f):
+    # Заголовок OpenEXR: атрибуты "имя\0тип\0<int32 размер><значение>" до пустого имени
+    if f.read(4) != b"\x76\x2f\x31\x01":
+        return None
+    f.read(4)
+    for _ in range(256):
+        name = _read_cstring(f)
+        if not name:
+            return None
+        _read_cstring(f)
+        size = struct.unpack("<i", f.read(4))[0]
+        value = f.read(size)
+        if name == b"dataWindow":
+            x_min, y_min, x_max, y_max = struct.unpack("<4i", value)
+            return x_max - x_min + 1, y_max - y_min + 1
+    return None
+
+
+def _read_png_size(f):
+    header = f.read(24)
+    if header[:8] != b"\x89PNG\r\n\x1a\n":
+        return None
+    return struct.unpack(">II", header[16:24])
+
+
+def _read_jpeg_size(f):
+    if f.read(2) != b"\xff\xd8":
+        return None
+    while True:
+        marker = f.read(2)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            return None
+        length = struct.unpack(">H", f.read(2))[0]
+        if 0xC0 <= marker[1] <= 0xCF and marker[1] not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack(">xHH", f.read(5))
+            return width, height
+        f.seek(length - 2, os.SEEK_CUR)
+
+
+_SIZE_READERS = {
+    ".hdr": _read_hdr_size,
+    ".exr": _read_exr_size,
+    ".png": _read_png_size,
+    ".jpg": _read_jpeg_size,
+    ".jpeg": _read_jpeg_size,
+}
+
+
+def read_metadata(path):
+    """Разрешение (по заголовку файла), формат и размер файла."""
+    st = os.stat(path)
+    ext = os.path.splitext(path)[1].lower()
+    try:
+        with open(path, 'rb') as f:
+            resolution = _SIZE_READERS[ext](f)
+    except (OSError, struct.error, ValueError) as e:
+        print(f"[Skybox] Не удалось прочитать заголовок {path}: {e}")
+        resolution = None
+
+    return {
+        "path": path,
+        "format": ext.lstrip(".").upper().replace("JPEG", "JPG"),
+        "resolution": resolution,
+        "size": st.st_size,
+        "mtime": st.st_mtime_ns,
+    }
+
+
+def describe(entry):
+    """Короткая подпись для панели: '4096×2048 · HDR · 24.1 МБ'."""
+    parts = []
+    if entry["resolution"]:
+        parts.append("{}×{}".format(*entry["resolution"]))
+    parts.append(entry["format"])
+    parts.append(f"{entry['size'] / (1024 * 1024):.1f} МБ")
+    return " · ".join(parts)
+
+
+# --- Индекс ---
+
+def get_index():
+    """Записи библиотеки {имя файла: метаданные}; перестраивается при изменении mtime папки."""
+    path = get_assets_dir()
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        if _index["dir"] != path:
+            print(f"[Skybox] Не найдена папка: {path}")
+        _index.update(dir=path, mtime=None, entries={}, items=[])
+        return _index["entries"]
+
+    if _index["dir"] == path and _index["mtime"] == mtime:
+        return _index["entries"]
+
+    old_entries = _index["entries"] if _index["dir"] == path else {}
+    entries = {}
+    for fname in os.listdir(path):
+        if os.path.splitext(fname)[1].lower() not in EXTENSIONS:
+            continue
+        fpath = os.path.join(path, fname)
+        old = old_entries.get(fname)
+        st = os.stat(fpath)
+        if old and old["mtime"] == st.st_mtime_ns and old["size"] == st.st_size:
+            entries[fname] = old
+        else:
+            entries[fname] = read_metadata(fpath)
+
+    _index.update(dir=path, mtime=mtime, entries=entries)
+    request_thumbnails()
+    request_proxies()
+    return entries
+
+
+def get_entry(fname):
+    return get_index().get(fname)
+
+
+def _rebuild_items():
+    # Blender требует, чтобы строки элементов EnumProperty жили, пока список используется,
+    # поэтому список хранится в модуле, а не собирается заново на каждый вызов
+    collection = _previews["collection"]
+    items = []
+    for number, fname in enumerate(sorted(_index["entries"], key=str.lower)):
+        entry = _index["entries"][fname]
+        icon_id = collection[fname].icon_id if collection is not None and fname in collection else 0
+        items.append((fname, fname, f"{describe(entry)}. Использовать {fname} в качестве скайбокса",
+                      icon_id or 'WORLD', number))
+    _index["items"] = items
+
+
+def enum_items():
+    """Элементы для EnumProperty skybox_file (с миниатюрами, когда они готовы)."""
+    get_index()
+    return _index["items"]
+
+
+# --- Миниатюры ---
+
+def get_thumb_dir():
+    path = os.path.join(tempfile.gettempdir(), THUMB_DIR_NAME)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def thumb_path(entry):
+    key = hashlib.sha1(f"{entry['path']}|{entry['mtime']}|{entry['size']}".encode()).hexdigest()[:16]
+    return os.path.join(get_thumb_dir(), f"{key}.png")
+
+
+def _render_thumbnail(source, target, is_hdr):
+    """Фоновый поток: уменьшает HDRI до THUMB_SIZE по ширине, тонирует (для HDR/EXR) и пишет PNG."""
+    image = oiio.ImageBuf(source)
+    spec = image.spec()
+    width = THUMB_SIZE
+    height = max(1, round(spec.height * THUMB_SIZE / max(spec.width, 1)))
+    small = oiio.ImageBufAlgo.resize(image, roi=oiio.ROI(0, width, 0, height, 0, 1, 0, spec.nchannels))
+
+    pixels = np.asarray(small.get_pixels(oiio.FLOAT), dtype=np.float32).reshape(height, width, -1)[:, :, :3]
+    if is_hdr:
+        pixels = pixels / (1.0 + pixels)  # HDR -> [0, 1] (Рейнхард)
+        pixels = np.power(np.clip(pixels, 0.0, 1.0), 1.0 / 2.2)
+    if pixels.shape[2] == 1:
+        pixels = np.repeat(pixels, 3, axis=2)
+
+    out = oiio.ImageBuf(oiio.ImageSpec(width, height, 3, oiio.UINT8))
+    out.set_pixels(oiio.ROI(0, width, 0, height, 0, 1, 0, 3), (np.clip(pixels, 0.0, 1.0) * 255.0).astype(np.uint8))
+    tmp_target = target + ".tmp.png"
+    if not out.write(tmp_target):
+        raise RuntimeError(out.geterror())
+    os.replace(tmp_target, target)
+    return target
+
+
+def request_proxies():
+    """
+    Ставит в фоновую очередь прокси для HDR/EXR библиотеки (готовые пропускаются).
+    В фоновом Blender (пакетные рендеры, resize_runner) не запускает процессы-генераторы:
+    там берётся то, что уже лежит в кэше.
+    """
+    if bpy.app.background:
+        return
+    hdri_proxy.request_proxies([(entry["path"], entry["resolution"][0] if entry["resolution"] else None)
+                                for entry in _index["entries"].values()
+                                if entry["format"] in ("HDR", "EXR")])
+
+
+def request_thumbnails():
+    """Ставит в фоновую очередь миниатюры, которых нет ни в коллекции превью, ни на диске."""
+    collection = _previews["collection"]
+    if collection is None:
+        _rebuild_items()
+        return
+
+    for fname, entry in _index["entries"].items():
+        if fname in collection or fname in _thumbs["pending"]:
+            continue
+        target = thumb_path(entry)
+        if os.path.isfile(target):
+            collection.load(fname, target, 'IMAGE')
+            continue
+        if oiio is None:
+            continue
+        if _thumbs["executor"] is None:
+            _thumbs["executor"] = ThreadPoolExecutor(max_workers=2, thread_name_prefix="kartoteka_thumbs")
+        _thumbs["pending"][fname] = _thumbs["executor"].submit(_render_thumbnail, entry["path"], target,
+                                                                  entry["format"] in ("HDR", "EXR"))
+
+    if _thumbs["pending"] and not bpy.app.timers.is_registered(_poll_thumbnails):
+        bpy.app.timers.register(_poll_thumbnails, first_interval=0.25)
+    _rebuild_items()
+
+
+def _poll_thumbnails():
+    """Таймер главного потока: подгружает готовые миниатюры и перерисовывает панели."""
+    collection = _previews["collection"]
+    if collection is None:
+        return None
+
+    loaded = False
+    for fname, future in list(_thumbs["pending"].items()):
+        if not future.done():
+            continue
+        del _thumbs["pending"][fname]
+        try:
+            target = future.result()
+        except Exception as e:
+            print(f"[Skybox] Миниатюра {fname} не создана: {e}")
+            continue
+        if fname not in collection:
+            collection.load(fname, target, 'IMAGE')
+            loaded = True
+
+    if loaded:
+        _rebuild_items()
+        for window in bpy.context.window_manager.windows:
+            for area in window.screen.areas:
+                if area.type == 'VIEW_3D':
+                    area.tag_redraw()
+
+    return 0.25 if _thumbs["pending"] else None
+
+
+def register():
+    _previews["collection"] = bpy.utils.previews.new()
+
+
+def unregister():
+    if bpy.app.timers.is_registered(_poll_thumbnails):
+        bpy.app.timers.unregister(_poll_thumbnails)
+    if _thumbs["executor"] is not None:
+        _thumbs["executor"].shutdown(wait=False, cancel_futures=True)
+        _thumbs["executor"] = None
+    _thumbs["pending"].clear()
+
+    if _previews["collection"] is not None:
+        bpy.utils.previews.remove(_previews["collection"])
+        _previews["collection"] = None
+    _index.update(dir=None, mtime=None, entries={}, items=[])
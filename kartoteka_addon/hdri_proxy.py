@@ -0,0 +1,169 @@
+"""
+Прокси HDRI: уменьшенные копии окружений (1K/2K/4K) для рендеров превью и иконок.
+
+Рендеру 384–512 px не нужна 8K-карта окружения, а её загрузка стоит секунд и сотен МБ.
+Прокси лежат в кэше во временной папке; имя файла включает хеш пути, mtime и размера
+исходника, поэтому изменённый HDRI получает новые прокси. Генерируют их фоновые
+процессы Blender (не более нескольких одновременно), интерфейс не ждёт.
+
+Модуль — и часть аддона (выбор прокси, очередь генерации), и скрипт фонового Blender:
+    blender -b --factory-startup -P hdri_proxy.py -- <исходник> <ширина> <путь> [<ширина> <путь> ...]
+"""
+
+import hashlib
+import math
+import os
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import bpy
+except ImportError:
+    bpy = None
+
+
+PROXY_WIDTHS = (1024, 2048, 4096)
+CACHE_DIR_NAME = "kartoteka_hdri_proxies"
+DEFAULT_FOV = math.radians(39.6)  # 50 мм на 36 мм кадра
+# Доля «полной» плотности пикселей фона, которой достаточно: фон превью мягкий (ГРИП),
+# а с размытием композитора — тем более. 512 px, 50 мм: 4655 * 0.5 -> 4K, * 0.25 -> 2K
+PROXY_SHARPNESS = 0.5
+BLURRED_SHARPNESS = 0.25
+WORKER_TIMEOUT = 600
+
+_jobs = {"executor": None, "pending": {}, "done": set()}  # ключ исходника -> Future; готовые ключи
+
+
+def get_cache_dir():
+    path = os.path.join(tempfile.gettempdir(), CACHE_DIR_NAME)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _source_key(source):
+    st = os.stat(source)
+    path = os.path.normcase(os.path.abspath(source))
+    return hashlib.sha1(f"{path}|{st.st_mtime_ns}|{st.st_size}".encode()).hexdigest()[:16]
+
+
+def proxy_path(source, width):
+    return os.path.join(get_cache_dir(), f"{_source_key(source)}_{width}.hdr")
+
+
+def proxy_widths(source_width=None):
+    """Ширины прокси, которые имеет смысл делать для исходника данной ширины."""
+    return [width for width in PROXY_WIDTHS if not source_width or width < source_width]
+
+
+def required_width(scene, blurred=False):
+    """
+    Нужная ширина равнопромежуточной карты для камеры сцены: при ширине res * 2π / fov
+    пиксель фона не крупнее пикселя рендера (кадр res пикселей видит угол fov, карта — 2π);
+    берётся доля PROXY_SHARPNESS (BLURRED_SHARPNESS, если фон размыт композитором).
+    """
+    render = scene.render
+    res = max(render.resolution_x, render.resolution_y) * render.resolution_percentage / 100.0
+    cam = scene.camera
+    fov = cam.data.angle if cam and cam.type == 'CAMERA' else DEFAULT_FOV
+    sharpness = BLURRED_SHARPNESS if blurred else PROXY_SHARPNESS
+    return math.ceil(res * 2.0 * math.pi / max(fov, 0.01) * sharpness)
+
+
+def select_image_path(source, source_width, needed_width):
+    """Наименьший готовый прокси не уже needed_width; если такого нет — сам исходник."""
+    for width in proxy_widths(source_width):
+        if width < needed_width:
+            continue
+        path = proxy_path(source, width)
+        if os.path.isfile(path):
+            return path
+    return source
+
+
+# --- Очередь генерации (в аддоне) ---
+
+def _run_worker(source, targets):
+    cmd = [bpy.app.binary_path, "-b", "--factory-startup", "-P", os.path.abspath(__file__), "--", source]
+    for width, path in targets:
+        cmd.extend([str(width), path])
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+                            timeout=WORKER_TIMEOUT)
+    if result.returncode != 0 or not all(os.path.isfile(path) for _width, path in targets):
+        raise RuntimeError(result.stdout[-2000:])
+    return source
+
+
+def request_proxies(sources):
+    """
+    Ставит в очередь генерацию недостающих прокси для sources — списка (путь, ширина исходника или None).
+    Уже готовые и уже запущенные исходники пропускаются.
+    """
+    for source, source_width in sources:
+        try:
+            key = _source_key(source)
+        except OSError:
+            continue
+        if key in _jobs["done"] or key in _jobs["pending"]:
+            continue
+
+        targets = [(width, proxy_path(source, width)) for width in proxy_widths(source_width)]
+        targets = [(width, path) for width, path in targets if not os.path.isfile(path)]
+        if not targets:
+            _jobs["done"].add(key)
+            continue
+
+        if _jobs["executor"] is None:
+            _jobs["executor"] = ThreadPoolExecutor(max_workers=max(1, (os.cpu_count() or 2) // 4),
+                                                   thread_name_prefix="kartoteka_hdri_proxy")
+        future = _jobs["executor"].submit(_run_worker, source, targets)
+        future.add_done_callback(lambda f, key=key: _on_done(key, f))
+        _jobs["pending"][key] = future
+
+
+def _on_done(key, future):
+    _jobs["pending"].pop(key, None)
+    try:
+        source = future.result()
+        _jobs["done"].add(key)
+        print(f"[Skybox] Прокси готовы: {os.path.basename(source)}")
+    except Exception as e:
+        print(f"[Skybox] Не удалось создать прокси: {e}")
+
+
+def pending_count():
+    return len(_jobs["pending"])
+
+
+def shutdown():
+    if _jobs["executor"] is not None:
+        _jobs["executor"].shutdown(wait=False, cancel_futures=True)
+        _jobs["executor"] = None
+    _jobs["pending"].clear()
+
+
+# --- Фоновый Blender ---
+
+def generate(source, targets):
+    """Уменьшает исходник последовательно от большей ширины к меньшей и пишет каждую в Radiance HDR."""
+    image = bpy.data.images.load(source)
+    source_width, source_height = image.size
+    for width, path in sorted(targets, reverse=True):
+        height = max(1, round(source_height * width / source_width))
+        image.scale(width, height)
+        image.file_format = 'HDR'
+        image.filepath_raw = path + ".tmp.hdr"
+        image.save()
+        os.replace(path + ".tmp.hdr", path)
+        print(f"[HDRI proxy] {width}x{height}: {path}")
+
+
+def main():
+    argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else []
+    source, pairs = argv[0], argv[1:]
+    generate(source, [(int(pairs[i]), pairs[i + 1]) for i in range(0, len(pairs), 2)])
+
+
+if __name__ == "__main__":
+    main()
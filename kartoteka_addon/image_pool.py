@@ -0,0 +1,105 @@
+import bpy
+import os
+from collections import OrderedDict
+
+
+# Общий пул image-datablock'ов для промежуточных картинок рендера и HDRI.
+# Один файл — один datablock: повторная загрузка того же пути перечитывает его
+# на месте (image.reload), а неиспользуемые картинки сверх лимита удаляются.
+
+MAX_IMAGES = 16
+
+_pool = OrderedDict()  # абсолютный путь -> {"image": Image, "stamp": (mtime_ns, size)}
+
+
+def _key(path):
+    return os.path.normcase(os.path.abspath(bpy.path.abspath(path)))
+
+
+def _stamp(path):
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+
+def _alive(image):
+    try:
+        image.name
+        return True
+    except ReferenceError:
+        return False
+
+
+def acquire(path, name=None):
+    """
+    Возвращает datablock для файла path.
+    Если файл уже в пуле и изменился на диске — перечитывает его на месте.
+    """
+    key = _key(path)
+    stamp = _stamp(key)
+
+    entry = _pool.get(key)
+    if entry and _alive(entry["image"]):
+        image = entry["image"]
+        if entry["stamp"] != stamp:
+            image.reload()
+            entry["stamp"] = stamp
+        _pool.move_to_end(key)
+    else:
+        images_before = len(bpy.data.images)
+        image = bpy.data.images.load(key, check_existing=True)
+        if len(bpy.data.images) == images_before:
+            # Datablock уже был в файле (например, с прошлой сессии) — данные могут быть устаревшими
+            image.reload()
+        _pool[key] = {"image": image, "stamp": stamp}
+
+    if name:
+        image.name = name
+
+    evict(keep=key)
+    return image
+
+
+def release(path):
+    """Убирает файл из пула и удаляет datablock, если он больше никем не используется."""
+    entry = _pool.pop(_key(path), None)
+    if entry and _alive(entry["image"]) and entry["image"].users == 0:
+        bpy.data.images.remove(entry["image"])
+
+
+def evict(max_images=MAX_IMAGES, keep=None):
+    """Удаляет самые давно запрошенные неиспользуемые картинки, пока пул больше max_images."""
+    for key in list(_pool):
+        if len(_pool) <= max_images:
+            break
+        if key == keep:
+            continue
+
+        image = _pool[key]["image"]
+        if not _alive(image):
+            del _pool[key]
+        elif image.users == 0:
+            bpy.data.images.remove(image)
+            del _pool[key]
+
+
+def clear():
+    """Забывает все картинки (после загрузки другого .blend ссылки на datablock'и недействительны)."""
+    _pool.clear()
+
+
+def image_bytes(image):
+    """Оценка памяти пикселей картинки (0, если буфер не загружен)."""
+    if not image.has_data:
+        return 0
+    width, height = image.size
+    return width * height * image.channels * (4 if image.is_float else 1)
+
+
+def pool_stats():
+    images = [entry["image"] for entry in _pool.values() if _alive(entry["image"])]
+    return len(images), sum(image_bytes(image) for image in images)
+
+
+def pool_summary():
+    count, total = pool_stats()
+    return f"пул изображений: {count} шт., {total / (1024 * 1024):.1f} МБ"
@@ -0,0 +1,45 @@
+import bpy
+
+
+# Объединение обновлений от свойств RenderSettings.
+# Пока ползунок тянут, update-колбэк вызывается на каждое изменение значения;
+# вместо немедленной работы колбэк откладывает функцию по ключу, а таймер выполняет
+# каждую отложенную функцию один раз в следующем проходе цикла событий (не чаще кадра).
+# Функция читает актуальные значения сама, поэтому выполняется с последним из них.
+
+_pending = {}  # ключ -> функция без аргументов
+
+
+def schedule(key, func):
+    """Откладывает func до следующего прохода цикла событий; повторный вызов с тем же key заменяет её."""
+    _pending[key] = func
+    if not bpy.app.timers.is_registered(_flush):
+        bpy.app.timers.register(_flush, first_interval=0.0)
+
+
+def _flush():
+    while _pending:
+        key = next(iter(_pending))
+        func = _pending.pop(key)
+        try:
+            func()
+        except Exception as e:
+            print(f"[WARNING] Обновление '{key}' не выполнено: {e}")
+    return None
+
+
+def flush():
+    """Выполняет отложенные обновления сразу (перед рендером, чтобы сцена была актуальной)."""
+    if bpy.app.timers.is_registered(_flush):
+        bpy.app.timers.unregister(_flush)
+    _flush()
+
+
+def register():
+    pass
+
+
+def unregister():
+    if bpy.app.timers.is_registered(_flush):
+        bpy.app.timers.unregister(_flush)
+    _pending.clear()
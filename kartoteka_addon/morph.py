@@ -10,6 +10,9 @@ bl_info = {
 
 import bpy
 import bmesh
+import time
+import numpy as np
+from bpy.app.handlers import persistent
 
 start_box = {
     "min-x": 0.0,
@@ -31,6 +34,95 @@ def calculate_multiplier(full_width, point):
 def calculate_difference(start, end):
     return end - start
 
+AXIS_INDEX = {'x': 0, 'y': 1, 'z': 2}
+
+def read_mesh_selection(obj, selected_only=True):
+    """
+    Координаты (N, 3) и маска выделения (N,) вершин меша одним переносом foreach_get.
+    В режиме редактирования меш сперва синхронизируется с edit-mesh (без переключения режимов).
+    selected_only=False — маска из всех вершин (пакетный режим без выделения).
+    """
+    if obj.mode == 'EDIT':
+        obj.update_from_editmode()
+    vertices = obj.data.vertices
+    count = len(vertices)
+    co = np.empty(count * 3, dtype=np.float32)
+    vertices.foreach_get("co", co)
+    if not selected_only:
+        return co.reshape(count, 3), np.ones(count, dtype=bool)
+    mask = np.empty(count, dtype=bool)
+    vertices.foreach_get("select", mask)
+    return co.reshape(count, 3), mask
+
+def read_evaluated_coords(obj, depsgraph):
+    """Координаты (N, 3) вершин вычисленного меша (с модификаторами) и маска из всех вершин."""
+    evaluated = obj.evaluated_get(depsgraph)
+    mesh = evaluated.to_mesh()
+    try:
+        count = len(mesh.vertices)
+        co = np.empty(count * 3, dtype=np.float32)
+        mesh.vertices.foreach_get("co", co)
+    finally:
+        evaluated.to_mesh_clear()
+    return co.reshape(count, 3), np.ones(count, dtype=bool)
+
+def write_mesh_coords(obj, co, changed=None):
+    """
+    Записывает координаты. Вне режима редактирования — одним foreach_set в меш.
+    В режиме редактирования edit-mesh не пересобирается (это стоило бы столько же,
+    сколько переключение режимов, и сбросило бы историю выделения): координаты пишутся
+    прямо в вершины BMesh, только для changed (маска (N,); None — все).
+    Это Python-цикл по сдвинутым вершинам: у BMesh нет пакетной записи координат.
+    Одноосевой морф (morph_axis) его обходит операторами BMesh; здесь он нужен
+    многоосевому морфу, где сдвигаемые вершины зависят от их координат.
+    """
+    mesh = obj.data
+    if obj.mode != 'EDIT':
+        mesh.vertices.foreach_set("co", co.ravel())
+        mesh.update()
+        return
+
+    bm = bmesh.from_edit_mesh(mesh)
+    bm.verts.ensure_lookup_table()
+    verts = bm.verts
+    indices = np.flatnonzero(changed) if changed is not None else np.arange(len(co))
+    for index, value in zip(indices.tolist(), co[indices].tolist()):
+        verts[index].co = value
+    bmesh.update_edit_mesh(mesh, loop_triangles=True, destructive=False)
+
+def morph_coords(co, mask, axis, multiplier=None, difference=None):
+    """Ядро морфа: умножает (multiplier) или сдвигает (difference) ось axis у выделенных вершин."""
+    index = AXIS_INDEX[axis]
+    if multiplier is not None:
+        co[mask, index] *= multiplier
+    if difference is not None:
+        co[mask, index] += difference
+    return co
+
+def morph_axis(obj, axis, multiplier=None, difference=None):
+    """
+    Морф одной оси у выделенных вершин obj. В режиме редактирования — операторы BMesh
+    (scale/translate на C) прямо по edit-mesh, без update_from_editmode и поэлементной
+    записи координат из Python; вне его — ядро morph_coords с foreach_get/foreach_set.
+    """
+    if obj.mode != 'EDIT':
+        co, mask = read_mesh_selection(obj)
+        write_mesh_coords(obj, morph_coords(co, mask, axis, multiplier, difference))
+        return
+
+    bm = bmesh.from_edit_mesh(obj.data)
+    verts = [v for v in bm.verts if v.select]
+    index = AXIS_INDEX[axis]
+    if multiplier is not None:
+        vec = [1.0, 1.0, 1.0]
+        vec[index] = multiplier
+        bmesh.ops.scale(bm, vec=vec, verts=verts)
+    if difference is not None:
+        vec = [0.0, 0.0, 0.0]
+        vec[index] = difference
+        bmesh.ops.translate(bm, vec=vec, verts=verts)
+    bmesh.update_edit_mesh(obj.data, loop_triangles=True, destructive=False)
+
 class Multiplier_Operator(bpy.types.Operator):
     bl_idname = "object.calculate_multiplier"
     bl_label = "Calculate Multiplier"
@@ -48,13 +140,14 @@ class Multiplier_Operator(bpy.types.Operator):
             return {'CANCELLED'}
         
         obj = context.active_object
+        if not obj or obj.type != 'MESH':
+            self.report({'WARNING'}, "Not active selected")
+            return {'CANCELLED'}
 
-        bm = bmesh.from_edit_mesh(obj.data)
-        active_verts = get_verts("act")
-    
-        if not active_verts:
+        # В режиме редактирования total_vert_sel — счётчик edit-mesh, без обхода вершин
+        if obj.data.total_vert_sel == 0:
             self.report({'WARNING'}, "Not active selected")
-            return
+            return {'CANCELLED'}
         
         zero_count = get_zero_count()
         if zero_count == len(start_box):    
@@ -91,29 +184,15 @@ class Multiplier_Operator(bpy.types.Operator):
         
         if context.scene.is_prop:
             multiplier = calculate_multiplier(full_width, finded)
+            if isinstance(multiplier, str):
+                self.report({'WARNING'}, multiplier)
+                return {'CANCELLED'}
             # self.report({'INFO'}, f"Multiplier: {multiplier}")
-            for v in active_verts:
-                if axis == 'x':
-                    v.co.x *= multiplier
-                elif axis == 'y':
-                    v.co.y *= multiplier
-                elif axis == 'z':
-                    v.co.z *= multiplier
+            morph_axis(obj, axis, multiplier=multiplier)
         else:
             difference = calculate_difference(finded, target)
             # self.report({'INFO'}, f"Difference: {difference}")
-            for v in active_verts:
-                if axis == 'x':
-                    v.co.x += difference
-                elif axis == 'y':
-                    v.co.y += difference
-                elif axis == 'z':
-                    v.co.z += difference
-
-        bmesh.update_edit_mesh(obj.data)
-            
-        bpy.ops.object.mode_set(mode='OBJECT')
-        bpy.ops.object.mode_set(mode='EDIT')
+            morph_axis(obj, axis, difference=difference)
 
         return {'FINISHED'}   
 
@@ -123,82 +202,243 @@ class Startbox_Operator(bpy.types.Operator):
     bl_options = {'REGISTER', 'UNDO'}
 
     def execute(self, context):
-        unified_object = None
-        duplicated_objects = None
         if context.mode != 'OBJECT':
             self.report({'WARNING'}, "Choose Object Mode!")
             return {'CANCELLED'}
-        
-        if context.mode == 'OBJECT':
-            selected_objects = context.selected_objects
-            if not selected_objects:
-                self.report({'WARNING'}, "No objects selected!")
-                return {'CANCELLED'}
-            
-            empties = [obj for obj in selected_objects if obj.type == 'EMPTY']
-            if empties:
-                self.report({'WARNING'}, "Selected objects include Empty types!")
-                return {'CANCELLED'}
-            
-            if selected_objects.__len__() > 1:
-                bpy.ops.object.duplicate()
-                duplicated_objects = context.selected_objects
-            
-            if duplicated_objects:
-                context.view_layer.objects.active = duplicated_objects[0]
-                bpy.ops.object.join()
-                unified_object = context.view_layer.objects.active
-                unified_object.name = "Joined Object"
-
-        bpy.ops.object.mode_set(mode='EDIT')
-        obj = context.active_object
-    
-        if not obj or obj.type != 'MESH' or context.mode != 'EDIT_MESH':
-            return
 
-        # # Получаем bmesh для объекта в режиме редактирования
-        bm = bmesh.from_edit_mesh(obj.data)
-        selected_verts = [v for v in bm.verts if v.select]
-        
-        if not selected_verts:
-            return
-        
-        for v in bm.verts:
-            v.select = True
+        selected_objects = context.selected_objects
+        if not selected_objects:
+            self.report({'WARNING'}, "No objects selected!")
+            return {'CANCELLED'}
 
-        start_box['max-x'] = max(v.co.x for v in selected_verts)
-        start_box['min-x'] = min(v.co.x for v in selected_verts)
-        start_box['max-y'] = max(v.co.y for v in selected_verts)
-        start_box['min-y'] = min(v.co.y for v in selected_verts)
-        start_box['max-z'] = max(v.co.z for v in selected_verts)
-        start_box['min-z'] = min(v.co.z for v in selected_verts)
+        empties = [obj for obj in selected_objects if obj.type == 'EMPTY']
+        if empties:
+            self.report({'WARNING'}, "Selected objects include Empty types!")
+            return {'CANCELLED'}
+
+        # Бокс по всем вершинам вычисленных мешей; выделение пользователя не трогается
+        meshes = [obj for obj in selected_objects if obj.type == 'MESH']
+        box = compute_start_box(context, meshes, selected_only=False, evaluated=True)
+        if box is None:
+            self.report({'WARNING'}, "No selected vertices!")
+            return {'CANCELLED'}
+
+        start_box.update(box)
 
         # self.report({'INFO'}, f"X: {start_box['min-x']}, {start_box['max-x']}")
         # self.report({'INFO'}, f"Y: {start_box['min-y']}, {start_box['max-y']}")
         # self.report({'INFO'}, f"Z: {start_box['min-z']}, {start_box['max-z']}")
 
-        if unified_object:
-            bpy.data.objects.remove(unified_object, do_unlink=True)
-
         return {'FINISHED'}    
-    
-def get_verts(variant):
-    selected_objects = [obj for obj in bpy.context.selected_objects if obj.type == 'MESH']
-    for obj in selected_objects:
-        bm = bmesh.from_edit_mesh(obj.data)
-        selected_verts = [v for v in bm.verts if v.select]
-
-    obj = bpy.context.active_object
-    if obj and obj.type == 'MESH':
-        bm = bmesh.from_edit_mesh(obj.data)
-        active_verts = [v for v in bm.verts if v.select]
-
-    if variant == "all":
-        return list(set(selected_verts + active_verts))
-    elif variant == "act":
-        return active_verts
-    elif variant == "sel":
-        return selected_verts
+
+def read_box_space(context, meshes, selected_only=True, world_space=False, evaluated=False):
+    """
+    Читает каждый меш один раз: [(объект, координаты, маска, матрица в систему бокса)].
+    Система бокса — координаты активного объекта (так же, как их видел бы объединённый меш),
+    без активного среди meshes или с world_space — мировая. Объекты с общим мешем делят одни массивы.
+    evaluated — вершины меша с модификаторами (только для бокса: число вершин может
+    отличаться от исходного меша, записывать такие координаты нельзя).
+    """
+    depsgraph = context.evaluated_depsgraph_get()
+    active = context.active_object if context.active_object in meshes and not world_space else None
+    to_local = np.linalg.inv(np.array(active.evaluated_get(depsgraph).matrix_world)) if active else np.eye(4)
+
+    arrays = {}
+    reads = []
+    for obj in meshes:
+        # Модификаторы у объектов с общим мешем разные — вычисленные меши общими не бывают
+        key = obj.as_pointer() if evaluated else obj.data.as_pointer()
+        if key not in arrays:
+            arrays[key] = read_evaluated_coords(obj, depsgraph) if evaluated else read_mesh_selection(obj, selected_only)
+        co, mask = arrays[key]
+        reads.append((obj, co, mask, to_local @ np.array(obj.evaluated_get(depsgraph).matrix_world)))
+    return reads
+
+def box_from_reads(reads):
+    """min/max (NumPy) выделенных вершин по результатам read_box_space; None — если вершин нет."""
+    box_min, box_max = None, None
+    for _obj, co, mask, matrix in reads:
+        if not mask.any():
+            continue
+        points = co[mask].astype(np.float64) @ matrix[:3, :3].T + matrix[:3, 3]
+        low, high = points.min(axis=0), points.max(axis=0)
+        box_min = low if box_min is None else np.minimum(box_min, low)
+        box_max = high if box_max is None else np.maximum(box_max, high)
+    return None if box_min is None else (box_min, box_max)
+
+def compute_start_box(context, meshes, selected_only=True, world_space=False, evaluated=False):
+    """
+    Стартовый бокс по выделенным вершинам мешей — без дублирования, объединения и смены режима.
+    Вершины каждого объекта переводятся в систему бокса (см. read_box_space), min/max — NumPy.
+    Возвращает словарь как start_box или None, если выделенных вершин нет.
+    selected_only=False — по всем вершинам; world_space — в мировых координатах;
+    evaluated — по вершинам меша с модификаторами (все вершины).
+    """
+    bounds = box_from_reads(read_box_space(context, meshes, selected_only, world_space, evaluated))
+    if bounds is None:
+        return None
+    return {f"{side}-{axis}": float(values[index])
+            for axis, index in AXIS_INDEX.items()
+            for side, values in (("min", bounds[0]), ("max", bounds[1]))}
+
+ANCHOR_ITEMS = [
+    ('MIN', "Min", "Неподвижна сторона с меньшей координатой"),
+    ('CENTER', "Center", "Размер меняется симметрично от центра"),
+    ('MAX', "Max", "Неподвижна сторона с большей координатой"),
+]
+
+def morph_box_coords(co, mask, box_min, box_max, targets, anchors, proportional):
+    """
+    Ядро морфа по трём осям: приводит габарит выделенных вершин box_min..box_max к targets
+    (0 — ось не меняется) относительно якорей anchors.
+    proportional — масштаб от якоря; иначе растяжение: вершины по подвижную сторону
+    от середины бокса сдвигаются на разницу размеров (при CENTER — обе половины на половину разницы).
+    """
+    for index, (target, anchor) in enumerate(zip(targets, anchors)):
+        low, high = box_min[index], box_max[index]
+        size = high - low
+        if target <= 0.0 or size <= 1e-9:
+            continue
+
+        values = co[mask, index]
+        middle = (low + high) / 2
+        if proportional:
+            pivot = {'MIN': low, 'CENTER': middle, 'MAX': high}[anchor]
+            values = pivot + (values - pivot) * (target / size)
+        else:
+            delta = target - size
+            if anchor == 'MIN':
+                values = values + np.where(values > middle, delta, 0.0)
+            elif anchor == 'MAX':
+                values = values - np.where(values < middle, delta, 0.0)
+            else:
+                values = values + np.where(values > middle, delta / 2, -delta / 2)
+        co[mask, index] = values
+    return co
+
+class MorphBox_Operator(bpy.types.Operator):
+    """Приводит мировые габариты выделенных вершин всех мешей в режиме редактирования к заданным X/Y/Z за один проход"""
+    bl_idname = "object.morph_box"
+    bl_label = "Morph X/Y/Z"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    size_x: bpy.props.FloatProperty(name="X", description="Новый мировой размер по X, с учётом масштаба объектов (0 — не менять)", default=0.0, min=0.0, subtype='DISTANCE')
+    size_y: bpy.props.FloatProperty(name="Y", description="Новый мировой размер по Y, с учётом масштаба объектов (0 — не менять)", default=0.0, min=0.0, subtype='DISTANCE')
+    size_z: bpy.props.FloatProperty(name="Z", description="Новый мировой размер по Z, с учётом масштаба объектов (0 — не менять)", default=0.0, min=0.0, subtype='DISTANCE')
+    anchor_x: bpy.props.EnumProperty(name="Anchor X", items=ANCHOR_ITEMS, default='CENTER')
+    anchor_y: bpy.props.EnumProperty(name="Anchor Y", items=ANCHOR_ITEMS, default='CENTER')
+    anchor_z: bpy.props.EnumProperty(name="Anchor Z", items=ANCHOR_ITEMS, default='MIN')
+    proportional: bpy.props.BoolProperty(name="Proportional", description="Масштабировать от якоря вместо растяжения", default=False)
+
+    @classmethod
+    def poll(cls, context):
+        return context.mode == 'EDIT_MESH'
+
+    def invoke(self, context, event):
+        # Текущие мировые габариты выделения — стартовые значения диалога (в тех же единицах, что и execute)
+        box = compute_start_box(context, [obj for obj in context.objects_in_mode if obj.type == 'MESH'],
+                                world_space=True)
+        if box:
+            for axis in AXIS_INDEX:
+                setattr(self, f"size_{axis}", box[f"max-{axis}"] - box[f"min-{axis}"])
+        return context.window_manager.invoke_props_dialog(self)
+
+    def draw(self, context):
+        layout = self.layout
+        layout.label(text="World-space size")
+        for axis in AXIS_INDEX:
+            row = layout.row(align=True)
+            row.prop(self, f"size_{axis}")
+            row.prop(self, f"anchor_{axis}", text="")
+        layout.prop(self, "proportional")
+
+    def execute(self, context):
+        started = time.perf_counter()
+        meshes = [obj for obj in context.objects_in_mode if obj.type == 'MESH']
+        results = morph_objects(context, meshes,
+                                (self.size_x, self.size_y, self.size_z),
+                                (self.anchor_x, self.anchor_y, self.anchor_z),
+                                self.proportional, world_space=True)
+        if results is None:
+            self.report({'WARNING'}, "Nothing selected")
+            return {'CANCELLED'}
+
+        lines = [f"{name}: {count} verts, {seconds * 1000:.1f} ms" for name, count, seconds in results]
+        for line in lines:
+            print(f"[MORPH] {line}")
+        self.report({'INFO'}, f"Morph X/Y/Z: {len(lines)} object(s), "
+                              f"{time.perf_counter() - started:.2f} s — " + "; ".join(lines))
+        return {'FINISHED'}
+
+def morph_objects(context, meshes, targets, anchors, proportional, selected_only=True, world_space=False):
+    """
+    Морф по трём осям для нескольких мешей за один проход (общий для оператора и resize_runner).
+    Каждый меш читается один раз: те же массивы дают и бокс, и вход ядра.
+    Бокс и ядро считаются в системе координат активного объекта (без активного или с world_space —
+    в мировой: размеры с учётом масштаба и поворота объектов, не зависящие от выделения).
+    Меш, общий для нескольких объектов, морфится один раз.
+    Возвращает [(имя объекта, число вершин, секунды морфа и записи)] или None, если вершин нет.
+    """
+    reads = read_box_space(context, meshes, selected_only, world_space)
+    bounds = box_from_reads(reads)
+    if bounds is None:
+        return None
+    box_min, box_max = bounds
+
+    results = []
+    done = set()
+    for obj, co, mask, matrix in reads:
+        if obj.data.as_pointer() in done or not mask.any():
+            continue
+        done.add(obj.data.as_pointer())
+
+        started = time.perf_counter()
+        inverse = np.linalg.inv(matrix)
+        points = co.astype(np.float64) @ matrix[:3, :3].T + matrix[:3, 3]
+        morph_box_coords(points, mask, box_min, box_max, targets, anchors, proportional)
+        new_co = (points @ inverse[:3, :3].T + inverse[:3, 3]).astype(np.float32)
+        changed = mask & np.any(new_co != co, axis=1)
+        write_mesh_coords(obj, new_co, changed)
+        results.append((obj.name, int(mask.sum()), time.perf_counter() - started))
+    return results
+
+# Статистика выделения для панели: считается один раз после изменения и хранится,
+# пока depsgraph не сообщит об обновлении меша/объекта (выделение в режиме
+# редактирования тоже приходит как обновление), либо после загрузки файла и undo/redo.
+# Число выделенных вершин берётся из Mesh.total_vert_sel (в режиме редактирования —
+# счётчик edit-mesh), поэтому перерисовка панели не обходит вершины.
+
+_selection_stats = {"valid": False, "count": 0, "objects": 0}
+
+def selection_stats(context):
+    """Число выделенных вершин и мешей с выделением среди объектов в режиме редактирования."""
+    if not _selection_stats["valid"]:
+        counts = [obj.data.total_vert_sel for obj in context.objects_in_mode if obj.type == 'MESH']
+        _selection_stats.update(valid=True, count=sum(counts), objects=sum(1 for count in counts if count))
+    return _selection_stats
+
+def invalidate_selection_stats():
+    _selection_stats["valid"] = False
+
+@persistent
+def _on_depsgraph_update(scene, depsgraph):
+    if not _selection_stats["valid"]:
+        return
+    for update in depsgraph.updates:
+        if isinstance(update.id, (bpy.types.Mesh, bpy.types.Object)):
+            invalidate_selection_stats()
+            return
+
+@persistent
+def _on_reset(*args):
+    invalidate_selection_stats()
+
+_handlers = (
+    (bpy.app.handlers.depsgraph_update_post, _on_depsgraph_update),
+    (bpy.app.handlers.load_post, _on_reset),
+    (bpy.app.handlers.undo_post, _on_reset),
+    (bpy.app.handlers.redo_post, _on_reset),
+)
 
 def get_zero_count():
     zero_points = 0
@@ -221,13 +461,15 @@ class VIEW3D_PT_COORDINATES(bpy.types.Panel):
             layout.label(text=" ")
 
         if context.mode == 'EDIT_MESH':
+            layout.operator("object.morph_box", text="Morph X/Y/Z")
             zero_count = get_zero_count()
             if zero_count != len(start_box):
-                selected_verts = get_verts("all")
-                if selected_verts.__len__() == 0:
+                stats = selection_stats(context)
+                if stats["count"] == 0:
                     layout.label(text="Nothing selected")
                     return
                 else:
+                    layout.label(text=f"Selected: {stats['count']} verts, {stats['objects']} mesh(es)")
                     cf = layout.column_flow(columns=2, align=True)
                     cf.prop(context.scene, "size")
                     cf.prop(context.scene, "is_prop")
@@ -261,9 +503,13 @@ class PANEL_OT_print_dropdown(bpy.types.Operator):
         return {'FINISHED'}
 
 def register():
+    for handlers, handler in _handlers:
+        if handler not in handlers:
+            handlers.append(handler)
     bpy.utils.register_class(VIEW3D_PT_COORDINATES)
     bpy.utils.register_class(Multiplier_Operator)
     bpy.utils.register_class(Startbox_Operator)
+    bpy.utils.register_class(MorphBox_Operator)
     bpy.types.Scene.size = bpy.props.IntProperty(name="Full Width", default=10)
     bpy.types.Scene.is_prop = bpy.props.BoolProperty(name="Proportional", default=False)
     bpy.utils.register_class(PANEL_OT_print_dropdown)
@@ -278,7 +524,12 @@ def unregister():
     bpy.utils.unregister_class(VIEW3D_PT_COORDINATES)
     bpy.utils.unregister_class(Multiplier_Operator)
     bpy.utils.unregister_class(Startbox_Operator)
+    bpy.utils.unregister_class(MorphBox_Operator)
     del bpy.types.Scene.size
     del bpy.types.Scene.is_prop
     bpy.utils.unregister_class(PANEL_OT_print_dropdown)
     del bpy.types.Scene.direction_dropdown
+    for handlers, handler in _handlers:
+        if handler in handlers:
+            handlers.remove(handler)
+    invalidate_selection_stats()
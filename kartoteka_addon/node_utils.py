@@ -20,20 +20,23 @@ def get_or_create_node(node_tree, node_type, label=None, name=None, location=(0,
     """
     bl_node_type = _bl_node_type_from_enum(node_type)
 
-    print(f"[DEBUG] Ищем узел типа {node_type} ({bl_node_type})...")
+    # Точное имя ищется через nodes.get (поиск на стороне Blender), перебор — только как запасной путь
+    if name:
+        node = node_tree.nodes.get(name)
+        if node and node.bl_idname == bl_node_type:
+            return node
 
-    for node in node_tree.nodes:
-        if node.bl_idname == bl_node_type:
-            if name and node.name.startswith(name):
-                print(f"[DEBUG] Найден существующий узел (по имени): {node.name}")
-                return node  # Узел с таким именем найден, возвращаем его
-            if label and node.label == label:
-                print(f"[DEBUG] Найден существующий узел (по label): {node.label}")
-                return node  # Узел с таким label найден, возвращаем его
+    if name or label:
+        for node in node_tree.nodes:
+            if node.bl_idname == bl_node_type:
+                if name and node.name.startswith(name):
+                    return node  # Узел с таким именем (с суффиксом .001 и т.п.) найден
+                if label and node.label == label:
+                    return node  # Узел с таким label найден
 
     # Если name передан, проверим, не существует ли узел с таким же именем (с учетом Blender-суффиксов .001 и т. д.)
-    existing_names = {node.name for node in node_tree.nodes}
-    if name in existing_names:
+    if name and name in node_tree.nodes:
+        existing_names = {node.name for node in node_tree.nodes}
         base_name = name
         counter = 1
         while f"{base_name}.{counter:03d}" in existing_names:
@@ -42,7 +45,6 @@ def get_or_create_node(node_tree, node_type, label=None, name=None, location=(0,
         print(f"[WARNING] Имя '{base_name}' уже занято, новый узел будет назван '{name}'.")
 
     # Создаём новый узел
-    print(f"[DEBUG] Создаём новый узел {bl_node_type} с именем {name}...")
     node = node_tree.nodes.new(bl_node_type)
     node.location = location
     if label:
@@ -54,7 +56,6 @@ def get_or_create_node(node_tree, node_type, label=None, name=None, location=(0,
     return node
 
 
-
 def _bl_node_type_from_enum(node_type):
     """
     Простая функция, чтобы вернуть фактическое имя класса,
@@ -72,6 +73,7 @@ def _bl_node_type_from_enum(node_type):
         'VIEWER': "CompositorNodeViewer",
         'COMPOSITE': "CompositorNodeComposite",
         'IMAGE': "CompositorNodeImage",
+        'OUTPUT_FILE': "CompositorNodeOutputFile",
     }
     return mapping.get(node_type, node_type)
 
@@ -87,9 +89,125 @@ def ensure_link(links, from_node, from_socket_name, to_node, to_socket_name):
     if not out_socket or not in_socket:
         return
 
-    # Проверим, нет ли уже такого линка
-    for link in links:
-        if link.from_socket == out_socket and link.to_socket == in_socket:
-            return  # уже связаны
+    # Неподключённый вход можно связывать сразу, не перебирая линки дерева
+    if in_socket.is_linked:
+        for link in links:
+            if link.from_socket == out_socket and link.to_socket == in_socket:
+                return  # уже связаны
 
     links.new(out_socket, in_socket)
+
+
+# --- Декларативные графы ---
+#
+# Граф описывается словарём:
+#   {"nodes": {имя: {"type": 'BLUR', "location": (x, y), "label": ...,
+#                    "props": {"use_relative": False, "format.file_format": 'PNG'},
+#                    "inputs": {"Fac": 1.0}}},
+#    "links": [(из ноды, выход, в ноду, вход), ...]}
+# Сокеты задаются именем или индексом; (None, None, нода, вход) — вход должен быть свободен.
+# reconcile_graph сравнивает описание с деревом и меняет только то, что расходится.
+
+
+def set_if_changed(struct, path, value):
+    """
+    Присваивает struct.<path> = value, только если значение отличается
+    (path может быть составным: 'format.file_format'). Возвращает 1, если что-то поменялось.
+    """
+    *parents, attr = path.split(".")
+    for parent in parents:
+        struct = getattr(struct, parent)
+
+    if _same_value(getattr(struct, attr), value):
+        return 0
+
+    setattr(struct, attr, value)
+    return 1
+
+
+def _same_value(current, value):
+    # Векторы/цвета сравниваются поэлементно, float — с допуском (значения сокетов хранятся во float32)
+    if isinstance(value, (tuple, list)):
+        current = tuple(current)
+        return len(current) == len(value) and all(_same_value(c, v) for c, v in zip(current, value))
+    if isinstance(value, float):
+        return isinstance(current, (int, float)) and abs(current - value) <= 1e-6 * max(1.0, abs(value))
+    return current == value
+
+
+def _find_socket(sockets, key):
+    if isinstance(key, int):
+        return sockets[key] if key < len(sockets) else None
+    return sockets.get(key)
+
+
+def reconcile_graph(node_tree, spec, exclusive=True):
+    """
+    Приводит node_tree к описанию spec и возвращает число изменений (0 — дерево не трогали).
+    exclusive=True: ноды вне описания удаляются, а у описанных нод отключаются
+    входы, которых нет в spec["links"] — граф совпадает с описанием целиком.
+    exclusive=False: правится только описанное (для частичных переключений).
+    """
+    nodes_spec = spec.get("nodes", {})
+    nodes = node_tree.nodes
+    changes = 0
+
+    index_nodes = {node.name: node for node in nodes}
+    for name, node_spec in nodes_spec.items():
+        node = index_nodes.get(name)
+        bl_node_type = _bl_node_type_from_enum(node_spec["type"])
+        if node is not None and node.bl_idname != bl_node_type:
+            nodes.remove(index_nodes.pop(name))
+            node = None
+            changes += 1
+
+        if node is None:
+            node = nodes.new(bl_node_type)
+            node.name = name
+            node.location = node_spec.get("location", (0, 0))
+            index_nodes[name] = node
+            changes += 1
+
+        if "label" in node_spec:
+            changes += set_if_changed(node, "label", node_spec["label"])
+        for path, value in node_spec.get("props", {}).items():
+            changes += set_if_changed(node, path, value)
+        for socket_key, value in node_spec.get("inputs", {}).items():
+            changes += set_if_changed(_find_socket(node.inputs, socket_key), "default_value", value)
+
+    if exclusive:
+        for name in [name for name in index_nodes if name not in nodes_spec]:
+            nodes.remove(index_nodes.pop(name))
+            changes += 1
+
+    # Линки индексируются после правки нод: удалённые ноды уносят свои линки с собой
+    links = node_tree.links
+    index_links = {(link.to_node.name, link.to_socket.identifier): link for link in links}
+    wanted = set()
+
+    for from_name, from_key, to_name, to_key in spec.get("links", ()):
+        to_socket = _find_socket(index_nodes[to_name].inputs, to_key)
+        from_socket = _find_socket(index_nodes[from_name].outputs, from_key) if from_name else None
+        if to_socket is None or (from_name and from_socket is None):
+            print(f"[WARNING] Нет сокета для линка {from_name}.{from_key} -> {to_name}.{to_key}")
+            continue
+
+        key = (to_name, to_socket.identifier)
+        wanted.add(key)
+        link = index_links.get(key)
+        if link is not None and from_socket is not None and link.from_socket == from_socket:
+            continue
+
+        if link is not None:
+            links.remove(index_links.pop(key))
+            changes += 1
+        if from_socket is not None:
+            index_links[key] = links.new(from_socket, to_socket)
+            changes += 1
+
+    if exclusive:
+        for key in [key for key in index_links if key not in wanted]:
+            links.remove(index_links.pop(key))
+            changes += 1
+
+    return changes
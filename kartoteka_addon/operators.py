@@ -1,11 +1,16 @@
 import bpy
 from bpy.types import Operator
-from bpy.props import StringProperty
+from bpy.props import BoolProperty, EnumProperty, IntProperty, StringProperty
 import os
-from .camera_utils import calculate_objects_bounds, setup_camera
+from .camera_utils import CAMERA_SIDE_ANGLES, calculate_objects_bounds, projected_border, setup_camera
+from .render_utils import border_region, get_session_dir, progress_step, run_stages
+from .skybox_manager import sync_skybox_resolution
+from . import image_pool, live_update, output_encoder, quality_tiers, render_manifest, skybox_cache, timings
 from .compositing_manager import (
     setup_compositing_nodes_for_icon,
     setup_compositing_nodes_for_preview,
+    setup_compositing_nodes_for_single_pass_preview,
+    render_single_pass_preview,
     setup_icon_settings,
     setup_preview_settings,
     setup_preview_settings_last_first_render
@@ -55,8 +60,8 @@ def find_topmost_parent(obj):
 
 
 def sanitize_filename(name, replacement='_'):
-    """Убираем из имени недопустимые для файлов символы."""
-    invalid_chars = r'\/:*?"<>|'
+    """Убираем из имени недопустимые для файлов символы и '#' (write_still заменяет его номером кадра)."""
+    invalid_chars = r'\/:*?"<>|#'
     for ch in invalid_chars:
         name = name.replace(ch, replacement)
     return name
@@ -79,131 +84,283 @@ def check_layer_exists(layer_name, operator=None):
     return True
 
 
-def save_project_if_unsaved():
+def delete_rendered_images():
+    """
+    Удаляет промежуточные 'object.png' и 'skybox.png' из временной папки сессии.
+    """
+    session_dir = get_session_dir()
+
+    files_to_delete = ["object.png", "skybox.png"]
+
+    for file_name in files_to_delete:
+        file_path = os.path.join(session_dir, file_name)
+        if os.path.isfile(file_path):
+            try:
+                os.remove(file_path)
+            except Exception as e:
+                print(f" Ошибка при удалении {file_path}: {e}")
+
+
+def create_new_layer():
     """
-    Проверяет, сохранён ли текущий проект. Если нет — сохраняет его на рабочий стол.
+    Создаёт ViewLayer 'Skybox_Layer' со всеми выключенными коллекциями.
+    Работает через scene.view_layers, а не через оператор, чтобы не зависеть
+    от окна (в фоне bpy.context.window == None).
     """
-    if bpy.data.filepath:
+    scene = bpy.context.scene
+    if "Skybox_Layer" in scene.view_layers:
         return
 
-    desktop_path = os.path.join(os.path.expanduser("~"), "Desktop")
+    skybox_layer = scene.view_layers.new(name="Skybox_Layer")
 
-    save_path = os.path.join(desktop_path, "kartoteka.view_project.blend")
+    for collection in scene.collection.children:
+        skybox_layer.layer_collection.children[collection.name].exclude = True
 
-    try:
-        # Сохраняем файл
-        bpy.ops.wm.save_as_mainfile(filepath=save_path)
-        print(f" Проект сохранён в: {save_path}")
-    except Exception as e:
-        print(f" Ошибка при сохранении: {e}")
 
+def get_save_directory(scene):
+    """Возвращает абсолютный путь сохранения рендеров, создавая папку при необходимости."""
+    save_directory = bpy.path.abspath(scene.render_settings.save_path)
+    if not os.path.exists(save_directory):
+        os.makedirs(save_directory)
+    return save_directory
 
-def delete_rendered_images():
+
+def prepare_preview_scene(scene):
     """
-    Удаляет файлы 'object.png' и 'skybox.png' в директории, где сохранён .blend-файл.
-    Если проект не сохранён, ничего не делает.
+    Подготовка сцены к рендеру превью, общая для всех объектов:
+    слой Skybox_Layer, движок, разрешение и граф композитинга.
+    Возвращает False, если нужных слоёв нет.
     """
-    blend_file_path = bpy.data.filepath
-    if not blend_file_path:
-        return
+    create_new_layer()
 
-    project_dir = os.path.dirname(blend_file_path)
+    scene.render.engine = scene.render_settings.render_engine
+    scene.render.resolution_x = 512
+    scene.render.resolution_y = 512
+    live_update.flush()
 
-    files_to_delete = ["object.png", "skybox.png"]
+    if not check_layer_exists("ViewLayer") or not check_layer_exists("Skybox_Layer"):
+        return False
 
-    for file_name in files_to_delete:
-        file_path = os.path.join(project_dir, file_name)
-        if os.path.isfile(file_path):
-            try:
-                os.remove(file_path)
-            except Exception as e:
-                print(f" Ошибка при удалении {file_path}: {e}")
+    with timings.stage("compositor"):
+        if scene.render_settings.preview_single_pass:
+            setup_compositing_nodes_for_single_pass_preview()
         else:
-            print(f"ℹ Файл не найден (не требует удаления): {file_path}")
+            setup_compositing_nodes_for_preview()
+    return True
 
 
-def create_new_layer():
-    if "Skybox_Layer" not in bpy.context.scene.view_layers:
-        # previous_view_layer = bpy.context.view_layer
-        bpy.ops.scene.view_layer_add(type='EMPTY')
-        bpy.context.view_layer.name = 'Skybox_Layer'
+BORDER_OBJECT_TYPES = {'MESH', 'CURVE', 'CURVES', 'SURFACE', 'META', 'FONT', 'POINTCLOUD', 'VOLUME',
+                       'GPENCIL', 'GREASEPENCIL'}
 
-        # Restore the previous view layer since the operator changes the active view layer
-        # bpy.context.window.view_layer = previous_view_layer
 
-        for collection in bpy.context.scene.collection.children:
-            bpy.context.window.view_layer.layer_collection.children[collection.name].exclude = True
+def object_border(scene, objs):
+    """
+    Рамка рендера по проекции габаритов на камеру сцены (None — весь кадр).
+    Проецируются objs и все видимые в этом проходе объекты, попадающие в рендер
+    (невыделенные дети иерархии, окружение), чтобы рамка их не обрезала.
+    """
+    settings = scene.render_settings
+    if not settings.border_render:
+        return None
+    with timings.stage("border"):
+        visible = [obj for obj in scene.objects
+                   if obj.type in BORDER_OBJECT_TYPES and not obj.hide_render and obj.visible_get()]
+        return projected_border(scene, scene.camera, list(dict.fromkeys([*objs, *visible])),
+                                settings.border_margin)
 
 
-class OBJECT_OT_RenderObjectPreview(Operator):
-    bl_idname = "object.render_object_preview"
-    bl_label = "Создать превью"
-    bl_options = {'REGISTER', 'UNDO'}
+def master_render_path():
+    """Несжатый PNG-буфер рендера в папке сессии, из которого output_encoder делает производные."""
+    return os.path.join(get_session_dir(), "render_master.png")
 
-    def execute(self, context):
-        scene = context.scene
 
-        save_project_if_unsaved()
+def render_preview(scene, objs, focus_obj, output_path, derivatives=(), side=None, angle=None):
+    """
+    Стадии превью: камера на объекты, рендер (объект + скайбокс), сохранение в output_path.
+    С derivatives рендер пишет несжатый буфер, а output_path и производные кодирует output_encoder.
+    side/angle — ракурс камеры вместо camera_position из настроек (для матрицы рендера).
+    Генератор запросов рендера (см. render_utils.run_stages).
+    """
+    settings = scene.render_settings
+    with timings.stage("bounds"):
+        center, size = calculate_objects_bounds(objs)
+
+    with timings.stage("camera"):
+        scene.camera = setup_camera(
+            scene=scene,
+            center=center,
+            size=size,
+            side=side or settings.camera_position,
+            camera_dist=settings.camera_distance,
+            focus_obj=focus_obj,
+            angle=angle,
+            fill_lights=settings.rig_fill_lights,
+            light_power=settings.rig_light_power
+        )
+        sync_skybox_resolution(scene)
+
+    border = object_border(scene, objs)
+
+    if settings.preview_single_pass:
+        render_path = master_render_path() if derivatives else output_path
+        yield from render_single_pass_preview(settings.compositing_blur, render_path,
+                                              use_cache=settings.skybox_cache,
+                                              cache_size_mb=settings.skybox_cache_size,
+                                              file_format='PNG' if derivatives else 'JPEG',
+                                              border=border)
+        if derivatives:
+            output_encoder.submit(render_path, output_path, derivatives, write_primary=True)
+        return
 
-        selected_objs = [obj for obj in context.selected_objects if obj.type == 'MESH']
-        if not selected_objs:
-            self.report({'WARNING'}, "Нет выделенных объектов!")
-            return {'CANCELLED'}
+    # Прозрачный проход объекта — только в рамке объекта, скайбокс — на весь кадр
+    with border_region(scene, border):
+        yield from setup_preview_settings(focus_obj)
+    yield from setup_preview_settings_last_first_render(settings.compositing_blur)
 
-        move_selected_objects_to_collection(selected_objs)
-        center, size = calculate_objects_bounds(selected_objs)
+    with timings.stage("write"):
+        bpy.data.images['Render Result'].save_render(filepath=output_path)
+    if derivatives:
+        output_encoder.submit(output_path, output_path, derivatives)
 
-        active_obj = context.active_object
-        if not active_obj:
-            self.report({'WARNING'}, "Нет активного объекта!")
-            return {'CANCELLED'}
 
-        create_new_layer()
+def prepare_icon_scene(scene):
+    """Подготовка сцены к рендеру иконок: движок, разрешение 3:4 и граф композитинга."""
+    scene.render.engine = scene.render_settings.render_engine
+    scene.render.resolution_x = 384
+    scene.render.resolution_y = 512
+    live_update.flush()
+
+    with timings.stage("compositor"):
+        setup_compositing_nodes_for_icon()
+    return True
+
 
-        camera_position = scene.render_settings.camera_position
-        camera_distance = scene.render_settings.camera_distance
-        render_engine = scene.render_settings.render_engine
-        compositing_blur = scene.render_settings.compositing_blur
+def render_icon(scene, objs, focus_obj, output_path, derivatives=(), side=None, angle=None):
+    """
+    Стадии иконки: камера на объекты, рендер одного ViewLayer прямо в output_path.
+    С derivatives рендер пишет несжатый буфер, а output_path и производные кодирует output_encoder.
+    side/angle — ракурс камеры вместо camera_position из настроек (для матрицы рендера).
+    Генератор запросов рендера (см. render_utils.run_stages).
+    """
+    with timings.stage("bounds"):
+        center, size = calculate_objects_bounds(objs)
 
-        cam = setup_camera(
+    with timings.stage("camera"):
+        scene.camera = setup_camera(
             scene=scene,
             center=center,
             size=size,
-            side=camera_position,
-            camera_dist=camera_distance,
-            focus_obj=active_obj
+            side=side or scene.render_settings.camera_position,
+            focus_obj=focus_obj,
+            angle=angle,
+            fill_lights=scene.render_settings.rig_fill_lights,
+            light_power=scene.render_settings.rig_light_power
         )
-        scene.camera = cam
-        scene.render.engine = render_engine
+        sync_skybox_resolution(scene)
 
-        scene.render.resolution_x = 512
-        scene.render.resolution_y = 512
+    render_path = master_render_path() if derivatives else output_path
+    with border_region(scene, object_border(scene, objs)):
+        yield from setup_icon_settings(focus_obj, render_path)
+    if derivatives:
+        output_encoder.submit(render_path, output_path, derivatives, write_primary=True)
 
-        if not check_layer_exists("ViewLayer") or not check_layer_exists("Skybox_Layer"):
-            self.report({'ERROR'},
-                        "Отсутствует один из слоёв: 'ViewLayer' или 'Skybox_Layer'. Создайте их перед запуском.")
-            return {'CANCELLED'}
 
-        setup_compositing_nodes_for_preview()
-        setup_preview_settings(active_obj)
-        setup_preview_settings_last_first_render(compositing_blur)
+def build_render_queue(objs, by_parent=True):
+    """
+    Собирает очередь пакетного рендера из мешей.
+    by_parent=True — один элемент на верхнего родителя (все выделенные меши его иерархии),
+    иначе — по элементу на каждый меш.
+    Элемент: {"name", "objects", "focus", "hierarchy"}; hierarchy — объекты,
+    которые надо скрыть из рендера, пока рендерится другой элемент.
+    """
+    queue = []
+    if by_parent:
+        groups = {}
+        for obj in objs:
+            groups.setdefault(find_topmost_parent(obj), []).append(obj)
+
+        for parent, members in groups.items():
+            queue.append({
+                "name": sanitize_filename(parent.name),
+                "objects": members,
+                "focus": members[0],
+                "hierarchy": [parent] + list(parent.children_recursive),
+            })
+    else:
+        for obj in objs:
+            queue.append({
+                "name": sanitize_filename(obj.name),
+                "objects": [obj],
+                "focus": obj,
+                "hierarchy": [obj],
+            })
+
+    queue.sort(key=lambda item: item["name"].lower())
+    return queue
 
-        top_parent = find_topmost_parent(active_obj)
-        base_name = sanitize_filename(top_parent.name)
 
-        save_directory = bpy.path.abspath(scene.render_settings.save_path)
-        if not os.path.exists(save_directory):
-            os.makedirs(save_directory)
+def selection_render_queue(objs, active_obj):
+    """Очередь из одного элемента: всё выделение, фокус и имя файла — по активному объекту."""
+    top_parent = find_topmost_parent(active_obj)
+    return [{
+        "name": sanitize_filename(top_parent.name),
+        "objects": objs,
+        "focus": active_obj,
+        "hierarchy": [],
+    }]
 
-        output_path = os.path.join(save_directory, f"{base_name}_preview.jpg")
 
-        bpy.data.images['Render Result'].save_render(filepath=output_path)
+def isolate_render_item(queue, current, hide_states):
+    """Скрывает из рендера все элементы очереди, кроме current (исходные флаги — в hide_states)."""
+    for item in queue:
+        for obj in item["hierarchy"]:
+            obj.hide_render = True if item is not current else hide_states[obj]
 
-        self.report({'INFO'}, f"Иконка сохранена: {output_path}")
 
-        delete_rendered_images()
+def run_selection_render(operator, context, outputs):
+    """Общий execute для кнопок «Создать превью» / «Создать иконку»: один рендер выделения."""
+    scene = context.scene
 
-        return {'FINISHED'}
+    timings.reset()
+
+    selected_objs = [obj for obj in context.selected_objects if obj.type == 'MESH']
+    if not selected_objs:
+        operator.report({'WARNING'}, "Нет выделенных объектов!")
+        return {'CANCELLED'}
+
+    active_obj = context.active_object
+    if not active_obj:
+        operator.report({'WARNING'}, "Нет активного объекта!")
+        return {'CANCELLED'}
+
+    results = []
+    try:
+        run_stages(iter_render_batch(scene, selection_render_queue(selected_objs, active_obj), outputs,
+                                     results, force=scene.render_settings.render_force))
+    except RuntimeError as e:
+        operator.report({'ERROR'}, str(e))
+        return {'CANCELLED'}
+
+    for output_path, error, skipped in results:
+        if error:
+            operator.report({'ERROR'}, f"Не удалось: {os.path.basename(output_path)} — {error}")
+            return {'CANCELLED'}
+        if skipped:
+            operator.report({'INFO'}, f"Без изменений, рендер пропущен: {output_path}")
+        else:
+            operator.report({'INFO'}, f"Сохранено: {output_path} ({skybox_cache.stats_summary()}, "
+                                      f"{quality_tiers.tier_summary(scene.render_settings.quality_tier)})")
+
+    return {'FINISHED'}
+
+
+class OBJECT_OT_RenderObjectPreview(Operator):
+    bl_idname = "object.render_object_preview"
+    bl_label = "Создать превью"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    def execute(self, context):
+        return run_selection_render(self, context, 'PREVIEW')
 
 
 class OBJECT_OT_RenderObjectIcon(Operator):
@@ -213,56 +370,516 @@ class OBJECT_OT_RenderObjectIcon(Operator):
     bl_options = {'REGISTER', 'UNDO'}
 
     def execute(self, context):
-        scene = context.scene
+        return run_selection_render(self, context, 'ICON')
+
+
+# Ракурс рендера по умолчанию: камера и материалы из настроек сцены
+DEFAULT_VIEWS = [{"suffix": "", "side": None, "angle": None, "material": None}]
+
+
+def build_render_views(sides=(), turntable_steps=0, materials=()):
+    """
+    Ракурсы матрицы рендера: стороны камеры (или turntable_steps углов поворотного стола
+    от фронтального) × варианты материала. Элемент: {"suffix", "side", "angle", "material"}.
+    """
+    if turntable_steps > 0:
+        base = CAMERA_SIDE_ANGLES['GENERAL']
+        cameras = [(f"_a{round(360.0 * i / turntable_steps):03d}", None, base + 360.0 * i / turntable_steps)
+                   for i in range(turntable_steps)]
+    elif sides:
+        cameras = [(f"_{side.lower()}", side, None) for side in CAMERA_SIDE_ANGLES if side in sides]
+    else:
+        cameras = [("", None, None)]
+
+    variants = [(f"_{sanitize_filename(material.name)}", material) for material in materials] or [("", None)]
+    return [{"suffix": camera_suffix + material_suffix, "side": side, "angle": angle, "material": material}
+            for material_suffix, material in variants
+            for camera_suffix, side, angle in cameras]
+
+
+def apply_material_variant(objs, material):
+    """Временно ставит material во все слоты objs. Возвращает [(слот, прежний материал)] для отката."""
+    saved = []
+    if material is None:
+        return saved
+    for obj in objs:
+        for slot in obj.material_slots:
+            if slot.material != material:
+                saved.append((slot, slot.material))
+                slot.material = material
+    return saved
+
+
+def restore_materials(saved):
+    # В обратном порядке: слот на общем меше мог быть перезаписан несколько раз
+    for slot, material in reversed(saved):
+        slot.material = material
+    saved.clear()
+
+
+def iter_render_batch(scene, queue, outputs, results, force=False, views=None):
+    """
+    Стадии пакетного рендера: сцена и композитинг настраиваются один раз на тип вывода,
+    дальше — цикл по очереди (build_render_queue / selection_render_queue)
+    и по ракурсам views (build_render_views; по умолчанию — один ракурс из настроек).
+    Результаты (output_path, error, skipped) дописываются в results, error — None при успехе.
+    Объекты, чей хеш входных данных совпадает с манифестом в папке сохранения,
+    пропускаются (skipped=True), если не задан force.
+    Бросает RuntimeError, если в сцене нет нужных слоёв.
+    """
+    with timings.stage("collect"):
+        move_selected_objects_to_collection([obj for item in queue for obj in item["objects"]])
+    skybox_cache.reset_stats()
+
+    hide_states = {obj: obj.hide_render for item in queue for obj in item["hierarchy"]}
+    save_directory = get_save_directory(scene)
+    manifest = render_manifest.load_manifest(save_directory)
+
+    try:
+        derivatives = output_encoder.parse_specs(scene.render_settings.output_derivatives)
+    except ValueError as e:
+        raise RuntimeError(str(e))
+    if derivatives and output_encoder.blocks_interface():
+        raise RuntimeError("Производные требуют Pillow (без него кодирование блокирует интерфейс): "
+                           "установите Pillow в Python Blender или запустите пакет в фоновом Blender.")
+
+    passes = []
+    if outputs in {'PREVIEW', 'BOTH'}:
+        passes.append(("preview", "jpg", prepare_preview_scene, render_preview))
+    if outputs in {'ICON', 'BOTH'}:
+        passes.append(("icon", "png", prepare_icon_scene, render_icon))
+
+    settings = scene.render_settings
+    views = views or DEFAULT_VIEWS
+    total = len(passes) * len(queue) * len(views)
+    quality_saved = {}
+    material_saved = []
+    # С производными запись в манифест ждёт фонового кодирования: неудачный файл не должен
+    # считаться актуальным. encoded: путь кодируемого файла -> индекс записи в results
+    encoded = {}
+    deferred = []  # (индекс в results, output_path, input_hash)
+    try:
+        for suffix, ext, prepare, render in passes:
+            if not prepare(scene):
+                raise RuntimeError(
+                    "Отсутствует один из слоёв: 'ViewLayer' или 'Skybox_Layer'. Создайте их перед запуском.")
+            # После prepare: движок уже выбран, уровень качества применяется к его настройкам
+            quality_tiers.apply_tier(scene, settings.quality_tier, settings.quality_time_limit, quality_saved)
+
+            for item, view in ((item, view) for item in queue for view in views):
+                yield progress_step(len(results), total, item["name"] + view["suffix"])
+
+                output_name = f"{item['name']}_{suffix}{view['suffix']}"
+                output_path = os.path.join(save_directory, f"{output_name}.{ext}")
+                derivative_paths = [output_encoder.derivative_path(output_path, spec) for spec in derivatives]
+                timings.begin_object(output_name)
+                # Материал варианта ставится до хеша, чтобы манифест отличал варианты
+                material_saved.extend(apply_material_variant(item["objects"], view["material"]))
+                try:
+                    with timings.stage("manifest"):
+                        input_hash = render_manifest.compute_input_hash(
+                            scene, item["objects"], suffix + view["suffix"], derivatives)
+                    if not force and render_manifest.is_up_to_date(manifest, output_path, input_hash,
+                                                                   derivative_paths):
+                        results.append((output_path, None, True))
+                        timings.end_object(status="skipped")
+                        continue
+
+                    isolate_render_item(queue, item, hide_states)
+                    try:
+                        yield from render(scene, item["objects"], item["focus"], output_path, derivatives,
+                                          side=view["side"], angle=view["angle"])
+                        results.append((output_path, None, False))
+                    except Exception as e:
+                        results.append((output_path, str(e), False))
+                        timings.end_object(status="error")
+                        continue
+                finally:
+                    restore_materials(material_saved)
+
+                if derivatives:
+                    index = len(results) - 1
+                    for path in (output_path, *derivative_paths):
+                        encoded[path] = index
+                    deferred.append((index, output_path, input_hash))
+                else:
+                    with timings.stage("manifest"):
+                        render_manifest.record_output(manifest, output_path, input_hash)
+                        render_manifest.save_manifest(save_directory, manifest)
+                timings.end_object(status="ok")
+    finally:
+        restore_materials(material_saved)
+        quality_tiers.restore_tier(quality_saved)
+        for obj, hidden in hide_states.items():
+            obj.hide_render = hidden
+        with timings.stage("cleanup"):
+            delete_rendered_images()
+        for path, error in output_encoder.wait_pending():
+            index = encoded.get(path)
+            if index is None:
+                print(f"[BATCH] ОШИБКА кодирования: {path} — {error}")
+                continue
+            output_path, previous, _skipped = results[index]
+            message = f"{os.path.basename(path)}: {error}"
+            results[index] = (output_path, f"{previous}; {message}" if previous else message, False)
+
+        if deferred:
+            with timings.stage("manifest"):
+                for index, output_path, input_hash in deferred:
+                    if not results[index][1]:
+                        render_manifest.record_output(manifest, output_path, input_hash)
+                render_manifest.save_manifest(save_directory, manifest)
+
+        if settings.timing_log_path:
+            timings.append_jsonl(bpy.path.abspath(settings.timing_log_path),
+                                 blend=bpy.data.filepath, engine=scene.render.engine, outputs=outputs,
+                                 quality=settings.quality_tier)
+
+    for path, error, skipped in results:
+        status = "ОШИБКА" if error else ("ПРОПУЩЕН" if skipped else "OK")
+        print(f"[BATCH] {status}: {path}" + (f" — {error}" if error else ""))
+    print(f"[BATCH] {skybox_cache.stats_summary()}, {image_pool.pool_summary()}")
+    print(f"[BATCH] {quality_tiers.tier_summary(settings.quality_tier)}")
+    print(f"[BATCH] {timings.summary(limit=10)}")
+
+
+def run_render_batch(scene, objs, outputs='BOTH', by_parent=True, force=False):
+    """
+    Синхронный пакетный рендер выделенных мешей.
+    Используется оператором OBJECT_OT_RenderBatch и фоновым batch_runner.
+    Возвращает список (output_path, error, skipped).
+    """
+    results = []
+    run_stages(iter_render_batch(scene, build_render_queue(objs, by_parent), outputs, results, force))
+    return results
+
+
+def report_batch_results(operator, results, scene):
+    failed = [(path, error) for path, error, _skipped in results if error]
+    skipped = sum(1 for _path, _error, was_skipped in results if was_skipped)
+    for path, error in failed:
+        operator.report({'WARNING'}, f"Не удалось: {os.path.basename(path)} — {error}")
+
+    operator.report({'INFO'}, f"Пакетный рендер: {len(results) - len(failed)} из {len(results)} успешно "
+                              f"(без изменений, пропущено: {skipped}), {skybox_cache.stats_summary()}")
+    operator.report({'INFO'}, quality_tiers.tier_summary(scene.render_settings.quality_tier).capitalize())
+    operator.report({'INFO'}, timings.summary().capitalize())
+
+
+class OBJECT_OT_RenderBatch(Operator):
+    """
+    Пакетный рендер превью и/или иконок для всех выделенных объектов.
+    Оператор без флага UNDO: за весь пакет не создаётся ни одного шага отмены.
+    """
+    bl_idname = "object.render_batch"
+    bl_label = "Пакетный рендер"
+    bl_options = {'REGISTER'}
+
+    outputs: EnumProperty(
+        name="Вывод",
+        items=[
+            ('PREVIEW', "Превью", "Только превью 1:1"),
+            ('ICON', "Иконки", "Только иконки 3:4"),
+            ('BOTH', "Превью и иконки", "Превью и иконки"),
+        ],
+        default='BOTH'
+    )
+
+    by_parent: BoolProperty(
+        name="По родителям",
+        description="Один рендер на верхнего родителя вместо рендера каждого меша",
+        default=True
+    )
+
+    force: BoolProperty(
+        name="Перерендерить всё",
+        description="Рендерить даже объекты, которые не изменились с прошлого рендера",
+        default=False
+    )
 
-        save_project_if_unsaved()
+    def execute(self, context):
+        timings.reset()
 
         selected_objs = [obj for obj in context.selected_objects if obj.type == 'MESH']
         if not selected_objs:
             self.report({'WARNING'}, "Нет выделенных объектов!")
             return {'CANCELLED'}
 
-        move_selected_objects_to_collection(selected_objs)
-        center, size = calculate_objects_bounds(selected_objs)
-        active_obj = context.active_object
-        if not active_obj:
-            self.report({'WARNING'}, "Нет активного объекта!")
+        try:
+            results = run_render_batch(context.scene, selected_objs, self.outputs, self.by_parent, self.force)
+        except RuntimeError as e:
+            self.report({'ERROR'}, str(e))
             return {'CANCELLED'}
 
-        camera_position = scene.render_settings.camera_position
-        render_engine = scene.render_settings.render_engine
+        report_batch_results(self, results, context.scene)
+        return {'FINISHED'}
 
-        cam = setup_camera(
-            scene=scene,
-            center=center,
-            size=size,
-            side=camera_position,
-            focus_obj=active_obj
+
+class OBJECT_OT_RenderMatrix(Operator):
+    """
+    Матрица рендера: превью/иконки × стороны камеры (или углы поворотного стола) × варианты материала
+    одним заданием. Между кадрами меняются только камера и материалы, а Cycles с persistent data
+    не пересобирает геометрию и BVH.
+    """
+    bl_idname = "object.render_matrix"
+    bl_label = "Матрица рендера"
+    bl_options = {'REGISTER'}
+
+    outputs: EnumProperty(
+        name="Вывод",
+        items=[
+            ('PREVIEW', "Превью", "Только превью 1:1"),
+            ('ICON', "Иконки", "Только иконки 3:4"),
+            ('BOTH', "Превью и иконки", "Превью и иконки"),
+        ],
+        default='BOTH'
+    )
+
+    camera_mode: EnumProperty(
+        name="Камера",
+        items=[
+            ('SIDES', "Стороны", "Выбранные позиции камеры"),
+            ('TURNTABLE', "Поворотный стол", "N равных углов вокруг объекта"),
+        ],
+        default='SIDES'
+    )
+
+    sides: EnumProperty(
+        name="Стороны",
+        items=[
+            ('GENERAL', "Общий план", "Камера общего плана"),
+            ('LEFT', "Слева", "Камера слева"),
+            ('RIGHT', "Справа", "Камера справа"),
+        ],
+        options={'ENUM_FLAG'},
+        default={'GENERAL', 'LEFT', 'RIGHT'}
+    )
+
+    turntable_steps: IntProperty(
+        name="Углов",
+        description="Число ракурсов поворотного стола",
+        default=8,
+        min=2,
+        max=72
+    )
+
+    material_variants: StringProperty(
+        name="Материалы",
+        description="Имена материалов через запятую; каждый вариант рендерится отдельно (пусто — как есть)",
+        default=""
+    )
+
+    by_parent: BoolProperty(
+        name="По родителям",
+        description="Один рендер на верхнего родителя вместо рендера каждого меша",
+        default=True
+    )
+
+    force: BoolProperty(
+        name="Перерендерить всё",
+        description="Рендерить даже объекты, которые не изменились с прошлого рендера",
+        default=False
+    )
+
+    def invoke(self, context, event):
+        return context.window_manager.invoke_props_dialog(self)
+
+    def draw(self, context):
+        layout = self.layout
+        layout.prop(self, "outputs")
+        layout.prop(self, "camera_mode", expand=True)
+        if self.camera_mode == 'SIDES':
+            layout.prop(self, "sides")
+        else:
+            layout.prop(self, "turntable_steps")
+        layout.prop(self, "material_variants")
+        row = layout.row(align=True)
+        row.prop(self, "by_parent", toggle=True)
+        row.prop(self, "force", toggle=True)
+
+    def execute(self, context):
+        scene = context.scene
+
+        materials = []
+        for name in (part.strip() for part in self.material_variants.split(",")):
+            if not name:
+                continue
+            material = bpy.data.materials.get(name)
+            if material is None:
+                self.report({'ERROR'}, f"Материал не найден: {name}")
+                return {'CANCELLED'}
+            materials.append(material)
+
+        if self.camera_mode == 'SIDES' and not self.sides:
+            self.report({'WARNING'}, "Не выбрано ни одной стороны камеры")
+            return {'CANCELLED'}
+
+        timings.reset()
+
+        selected_objs = [obj for obj in context.selected_objects if obj.type == 'MESH']
+        if not selected_objs:
+            self.report({'WARNING'}, "Нет выделенных объектов!")
+            return {'CANCELLED'}
+
+        views = build_render_views(
+            sides=self.sides if self.camera_mode == 'SIDES' else (),
+            turntable_steps=self.turntable_steps if self.camera_mode == 'TURNTABLE' else 0,
+            materials=materials
         )
-        scene.camera = cam
-        scene.render.engine = render_engine
 
-        scene.render.resolution_x = 384
-        scene.render.resolution_y = 512
+        # Persistent data: геометрия синхронизируется с Cycles один раз на весь пакет
+        use_persistent_data = scene.render.use_persistent_data
+        scene.render.use_persistent_data = True
+        results = []
+        try:
+            run_stages(iter_render_batch(scene, build_render_queue(selected_objs, self.by_parent),
+                                         self.outputs, results, self.force, views=views))
+        except RuntimeError as e:
+            self.report({'ERROR'}, str(e))
+            return {'CANCELLED'}
+        finally:
+            scene.render.use_persistent_data = use_persistent_data
+
+        report_batch_results(self, results, scene)
+        return {'FINISHED'}
 
-        setup_compositing_nodes_for_icon()
-        setup_icon_settings(active_obj)
 
-        top_parent = find_topmost_parent(active_obj)
-        base_name = sanitize_filename(top_parent.name)
+# Состояние неблокирующего рендера, общее для оператора и обработчиков render_complete/render_cancel
+_modal_render = {"running": False, "rendering": False, "cancelled": False}
 
-        save_directory = bpy.path.abspath(scene.render_settings.save_path)
-        if not os.path.exists(save_directory):
-            os.makedirs(save_directory)
 
-        output_path = os.path.join(save_directory, f"{base_name}_icon.png")
+def _on_render_complete(*args):
+    _modal_render["rendering"] = False
 
-        bpy.data.images['Render Result'].save_render(filepath=output_path)
 
-        self.report({'INFO'}, f"Иконка сохранена: {output_path}")
+def _on_render_cancel(*args):
+    _modal_render["rendering"] = False
+    _modal_render["cancelled"] = True
 
-        delete_rendered_images()
 
+class OBJECT_OT_RenderModal(Operator):
+    """
+    Неблокирующий рендер превью, иконок или пакета.
+    Стадии пайплайна выполняются по таймеру, рендеры запускаются через INVOKE_DEFAULT,
+    поэтому интерфейс не замирает. Esc отменяет между стадиями и объектами.
+    """
+    bl_idname = "object.render_modal"
+    bl_label = "Рендер без блокировки"
+    bl_options = {'REGISTER'}
+
+    outputs: EnumProperty(
+        name="Вывод",
+        items=[
+            ('PREVIEW', "Превью", "Только превью 1:1"),
+            ('ICON', "Иконки", "Только иконки 3:4"),
+            ('BOTH', "Превью и иконки", "Превью и иконки"),
+        ],
+        default='PREVIEW'
+    )
+
+    grouping: EnumProperty(
+        name="Очередь",
+        items=[
+            ('SELECTION', "Выделение", "Один рендер всего выделения, имя — по активному объекту"),
+            ('PARENT', "По родителям", "Один рендер на верхнего родителя"),
+            ('OBJECT', "По объектам", "Рендер каждого меша отдельно"),
+        ],
+        default='SELECTION'
+    )
+
+    force: BoolProperty(
+        name="Перерендерить всё",
+        description="Рендерить даже объекты, которые не изменились с прошлого рендера",
+        default=False
+    )
+
+    def invoke(self, context, event):
+        if _modal_render["running"]:
+            self.report({'WARNING'}, "Рендер уже идёт")
+            return {'CANCELLED'}
+
+        timings.reset()
+
+        selected_objs = [obj for obj in context.selected_objects if obj.type == 'MESH']
+        if not selected_objs:
+            self.report({'WARNING'}, "Нет выделенных объектов!")
+            return {'CANCELLED'}
+
+        if self.grouping == 'SELECTION':
+            if not context.active_object:
+                self.report({'WARNING'}, "Нет активного объекта!")
+                return {'CANCELLED'}
+            queue = selection_render_queue(selected_objs, context.active_object)
+        else:
+            queue = build_render_queue(selected_objs, self.grouping == 'PARENT')
+
+        self._results = []
+        self._stages = iter_render_batch(context.scene, queue, self.outputs, self._results, self.force)
+        self._error = None
+        _modal_render.update(running=True, rendering=False, cancelled=False)
+
+        bpy.app.handlers.render_complete.append(_on_render_complete)
+        bpy.app.handlers.render_cancel.append(_on_render_cancel)
+
+        wm = context.window_manager
+        wm.progress_begin(0, 100)
+        self._timer = wm.event_timer_add(0.1, window=context.window)
+        wm.modal_handler_add(self)
+        return {'RUNNING_MODAL'}
+
+    def modal(self, context, event):
+        if event.type == 'ESC' and event.value == 'PRESS':
+            _modal_render["cancelled"] = True
+            return {'RUNNING_MODAL'}
+
+        if event.type != 'TIMER' or _modal_render["rendering"]:
+            return {'PASS_THROUGH'}
+
+        if _modal_render["cancelled"]:
+            self._stages.close()
+            return self._finish(context, cancelled=True)
+
+        try:
+            request = self._stages.throw(self._error) if self._error else next(self._stages)
+        except StopIteration:
+            return self._finish(context)
+        except RuntimeError as e:
+            self.report({'ERROR'}, str(e))
+            return self._finish(context, cancelled=True)
+        except Exception as e:
+            # Любая другая ошибка стадии тоже должна снять обработчики и флаг running
+            self.report({'ERROR'}, f"Ошибка пакетного рендера: {type(e).__name__}: {e}")
+            return self._finish(context, cancelled=True)
+        self._error = None
+
+        if request["type"] == 'STEP':
+            context.window_manager.progress_update(100 * request["done"] / max(1, request["total"]))
+            context.workspace.status_text_set(
+                f"Kartoteka: {request['done'] + 1}/{request['total']} {request['label']} — Esc для отмены")
+        else:
+            _modal_render["rendering"] = True
+            if 'RUNNING_MODAL' not in bpy.ops.render.render('INVOKE_DEFAULT', write_still=request["write_still"]):
+                _modal_render["rendering"] = False
+                self._error = RuntimeError("Не удалось запустить рендер")
+
+        return {'PASS_THROUGH'}
+
+    def _finish(self, context, cancelled=False):
+        wm = context.window_manager
+        wm.event_timer_remove(self._timer)
+        wm.progress_end()
+        context.workspace.status_text_set(None)
+
+        for handlers, handler in ((bpy.app.handlers.render_complete, _on_render_complete),
+                                  (bpy.app.handlers.render_cancel, _on_render_cancel)):
+            if handler in handlers:
+                handlers.remove(handler)
+        _modal_render.update(running=False, rendering=False)
+
+        report_batch_results(self, self._results, context.scene)
+        if cancelled:
+            self.report({'WARNING'}, "Рендер отменён")
+            return {'CANCELLED'}
         return {'FINISHED'}
 
 
@@ -285,9 +902,15 @@ class OBJECT_OT_SetSavePath(Operator):
 def register():
     bpy.utils.register_class(OBJECT_OT_RenderObjectPreview)
     bpy.utils.register_class(OBJECT_OT_RenderObjectIcon)
+    bpy.utils.register_class(OBJECT_OT_RenderBatch)
+    bpy.utils.register_class(OBJECT_OT_RenderMatrix)
+    bpy.utils.register_class(OBJECT_OT_RenderModal)
     bpy.utils.register_class(OBJECT_OT_SetSavePath)
 
 def unregister():
     bpy.utils.unregister_class(OBJECT_OT_RenderObjectPreview)
     bpy.utils.unregister_class(OBJECT_OT_RenderObjectIcon)
+    bpy.utils.unregister_class(OBJECT_OT_RenderBatch)
+    bpy.utils.unregister_class(OBJECT_OT_RenderMatrix)
+    bpy.utils.unregister_class(OBJECT_OT_RenderModal)
     bpy.utils.unregister_class(OBJECT_OT_SetSavePath)
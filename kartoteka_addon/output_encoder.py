@@ -0,0 +1,215 @@
+import bpy
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from . import image_pool, timings
+
+try:
+    from PIL import Image as PILImage
+except ImportError:
+    PILImage = None
+
+
+# Производные рендера (размеры, JPEG/PNG/WebP, обрезка прозрачных полей).
+# Пиксели рендера читаются один раз в NumPy-буфер, дальше масштабирование и кодирование
+# идут в пуле потоков, пока главный поток рендерит следующий объект.
+# Кодирование в потоках — через Pillow; без него — через Blender в главном потоке.
+# Запасной путь блокирует интерфейс на всё время кодирования, поэтому без Pillow
+# производные разрешены только в фоновом Blender (blender -b), где интерфейса нет.
+
+FORMATS = {"jpg": 'JPEG', "jpeg": 'JPEG', "png": 'PNG', "webp": 'WEBP'}
+DEFAULT_QUALITY = 90
+
+_executor = None
+_pending = []  # (path, Future)
+
+
+def blocks_interface():
+    """True, если производные пришлось бы кодировать в главном потоке открытого интерфейса (нет Pillow)."""
+    return PILImage is None and not bpy.app.background
+
+
+def parse_specs(text):
+    """
+    Разбирает строку производных: '1024:jpg:90, 512:webp:85, 256:png:trim'.
+    Для каждого элемента: размер длинной стороны (0 — как у рендера), формат,
+    необязательное качество и флаг trim (обрезать прозрачные поля).
+    """
+    specs = []
+    for chunk in (text or "").split(","):
+        parts = [part.strip().lower() for part in chunk.split(":") if part.strip()]
+        if not parts:
+            continue
+
+        spec = {"size": 0, "ext": "png", "quality": DEFAULT_QUALITY, "trim": False}
+        numbers = []
+        for part in parts:
+            if part == "trim":
+                spec["trim"] = True
+            elif part in FORMATS:
+                spec["ext"] = part
+            elif part.isdigit():
+                numbers.append(int(part))
+            else:
+                raise ValueError(f"Непонятный параметр производной: '{part}' в '{chunk.strip()}'")
+
+        if numbers:
+            spec["size"] = numbers[0]
+        if len(numbers) > 1:
+            spec["quality"] = max(1, min(100, numbers[1]))
+        specs.append(spec)
+    return specs
+
+
+def derivative_path(output_path, spec):
+    base = os.path.splitext(output_path)[0]
+    size = spec["size"] or "full"
+    trim = "_trim" if spec["trim"] else ""
+    return f"{base}_{size}{trim}.{spec['ext']}"
+
+
+def read_pixels(path):
+    """Читает картинку в uint8-буфер (height, width, 4), строки сверху вниз."""
+    image = image_pool.acquire(path)
+    width, height = image.size
+    channels = image.channels
+
+    buffer = np.empty(width * height * channels, dtype=np.float32)
+    image.pixels.foreach_get(buffer)
+    pixels = np.flipud(buffer.reshape(height, width, channels))
+
+    if channels == 3:
+        pixels = np.concatenate([pixels, np.ones((height, width, 1), dtype=np.float32)], axis=2)
+    return (np.clip(pixels, 0.0, 1.0) * 255.0 + 0.5).astype(np.uint8)
+
+
+def trim_transparent(pixels):
+    """Обрезает полностью прозрачные поля по альфе."""
+    rows = np.flatnonzero(pixels[:, :, 3].any(axis=1))
+    cols = np.flatnonzero(pixels[:, :, 3].any(axis=0))
+    if rows.size == 0 or cols.size == 0:
+        return pixels
+    return pixels[rows[0]:rows[-1] + 1, cols[0]:cols[-1] + 1]
+
+
+def _area_weights(src, dst):
+    """Матрица (dst, src) весов усреднения по площади при масштабировании src -> dst пикселей."""
+    scale = src / dst
+    edges = np.arange(dst + 1) * scale
+    index = np.arange(src)
+    overlap = (np.minimum(edges[1:, None], index[None, :] + 1)
+               - np.maximum(edges[:-1, None], index[None, :]))
+    return np.clip(overlap, 0.0, None) / scale
+
+
+def resize_to_fit(pixels, size):
+    """Масштабирует так, чтобы длинная сторона стала size (усреднение по площади, альфа предумножена)."""
+    height, width = pixels.shape[:2]
+    if not size or max(width, height) == size:
+        return pixels
+
+    factor = size / max(width, height)
+    new_width = max(1, round(width * factor))
+    new_height = max(1, round(height * factor))
+
+    image = pixels.astype(np.float32) / 255.0
+    image[:, :, :3] *= image[:, :, 3:4]
+
+    weights_y = _area_weights(height, new_height)
+    weights_x = _area_weights(width, new_width)
+    image = np.tensordot(weights_y, image, axes=(1, 0))                   # (new_h, w, 4)
+    image = np.tensordot(image, weights_x, axes=(1, 1)).transpose(0, 2, 1)  # (new_h, new_w, 4)
+
+    alpha = image[:, :, 3:4]
+    image[:, :, :3] = np.where(alpha > 0, image[:, :, :3] / np.maximum(alpha, 1e-6), 0.0)
+    return (np.clip(image, 0.0, 1.0) * 255.0 + 0.5).astype(np.uint8)
+
+
+def flatten_on_white(pixels):
+    """Для форматов без альфы (JPEG): накладывает картинку на белый фон."""
+    rgb = pixels[:, :, :3].astype(np.float32)
+    alpha = pixels[:, :, 3:4].astype(np.float32) / 255.0
+    return (rgb * alpha + 255.0 * (1.0 - alpha) + 0.5).astype(np.uint8)
+
+
+def _process(pixels, spec):
+    if spec["trim"]:
+        pixels = trim_transparent(pixels)
+    return resize_to_fit(pixels, spec["size"])
+
+
+def _encode_with_pillow(pixels, path, spec):
+    pixels = _process(pixels, spec)
+    file_format = FORMATS[spec["ext"]]
+    if file_format == 'JPEG':
+        PILImage.fromarray(flatten_on_white(pixels), "RGB").save(path, "JPEG", quality=spec["quality"])
+    elif file_format == 'WEBP':
+        PILImage.fromarray(pixels, "RGBA").save(path, "WEBP", quality=spec["quality"])
+    else:
+        PILImage.fromarray(pixels, "RGBA").save(path, "PNG")
+
+
+def _encode_with_blender(pixels, path, spec):
+    """Запасной путь без Pillow: временная картинка Blender, только главный поток."""
+    pixels = _process(pixels, spec)
+    file_format = FORMATS[spec["ext"]]
+    if file_format == 'JPEG':
+        pixels = np.concatenate([flatten_on_white(pixels), np.full(pixels.shape[:2] + (1,), 255, np.uint8)],
+                                axis=2)
+
+    height, width = pixels.shape[:2]
+    image = bpy.data.images.new("KartotekaEncode", width, height, alpha=True)
+    try:
+        image.pixels.foreach_set((np.flipud(pixels).astype(np.float32) / 255.0).ravel())
+        image.file_format = file_format
+        image.save(filepath=path, quality=spec["quality"])
+    finally:
+        bpy.data.images.remove(image)
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=max(1, (os.cpu_count() or 2) // 2),
+                                       thread_name_prefix="kartoteka_encode")
+    return _executor
+
+
+def submit(source_path, output_path, specs, write_primary=False):
+    """
+    Читает пиксели source_path и ставит в очередь кодирование производных
+    (и самого output_path, если write_primary). Возвращает пути запланированных файлов.
+    Ошибки кодирования собирает wait_pending().
+    """
+    with timings.stage("encode:read"):
+        pixels = read_pixels(source_path)
+
+    jobs = []
+    if write_primary:
+        ext = os.path.splitext(output_path)[1].lstrip(".").lower()
+        jobs.append((output_path, {"size": 0, "ext": ext, "quality": DEFAULT_QUALITY, "trim": False}))
+    jobs.extend((derivative_path(output_path, spec), spec) for spec in specs)
+
+    for path, spec in jobs:
+        if PILImage is not None:
+            _pending.append((path, _get_executor().submit(_encode_with_pillow, pixels, path, spec)))
+        else:
+            with timings.stage("encode"):
+                _encode_with_blender(pixels, path, spec)
+
+    return [path for path, _spec in jobs]
+
+
+def wait_pending():
+    """Дожидается всех фоновых кодирований. Возвращает список (path, error) для упавших."""
+    errors = []
+    with timings.stage("encode:wait"):
+        for path, future in _pending:
+            try:
+                future.result()
+            except Exception as e:
+                errors.append((path, str(e)))
+    _pending.clear()
+    return errors
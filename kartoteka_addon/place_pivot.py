@@ -1,5 +1,6 @@
 import bpy
 import mathutils
+from .bounds import object_corners
 
 class OBJECT_OT_place_pivot(bpy.types.Operator):
     bl_idname = "object.place_pivot"
@@ -57,29 +58,27 @@ class OBJECT_OT_place_pivot(bpy.types.Operator):
         return {'FINISHED'}
     
     def set_origin_point(self, obj, context):
-        bbox_corners = [obj.matrix_world @ mathutils.Vector(corner) for corner in obj.bound_box]
+        # Временный объект после join: его указатель может достаться следующему такому же объекту
+        bbox_corners = object_corners(obj, use_cache=False)
+        bbox_min = bbox_corners.min(axis=0)
+        bbox_max = bbox_corners.max(axis=0)
+        center = bbox_corners.mean(axis=0)
         new_origin = (0, 0, 0)
 
         # by Z
         if self.direction in ["pivot_top", "pivot_bottom"]:
-            point_z = max(corner.z for corner in bbox_corners) if self.direction == "pivot_top" else min(corner.z for corner in bbox_corners)
-            center_x = sum(corner.x for corner in bbox_corners) / 8
-            center_y = sum(corner.y for corner in bbox_corners) / 8
-            new_origin = mathutils.Vector((center_x, center_y, point_z))
+            point_z = bbox_max[2] if self.direction == "pivot_top" else bbox_min[2]
+            new_origin = mathutils.Vector((center[0], center[1], point_z))
         
         # by X
         elif self.direction in ["pivot_left", "pivot_right"]:
-            point_x = min(corner.x for corner in bbox_corners) if self.direction == "pivot_left" else max(corner.x for corner in bbox_corners)
-            center_y = sum(corner.y for corner in bbox_corners) / 8
-            center_z = sum(corner.z for corner in bbox_corners) / 8
-            new_origin = mathutils.Vector((point_x, center_y, center_z))
+            point_x = bbox_min[0] if self.direction == "pivot_left" else bbox_max[0]
+            new_origin = mathutils.Vector((point_x, center[1], center[2]))
 
         # by Y
         elif self.direction in ["pivot_front", "pivot_back"]:
-            point_y = min(corner.y for corner in bbox_corners) if self.direction == "pivot_front" else max(corner.y for corner in bbox_corners)
-            center_x = sum(corner.x for corner in bbox_corners) / 8
-            center_z = sum(corner.z for corner in bbox_corners) / 8
-            new_origin = mathutils.Vector((center_x, point_y, center_z))
+            point_y = bbox_min[1] if self.direction == "pivot_front" else bbox_max[1]
+            new_origin = mathutils.Vector((center[0], point_y, center[2]))
         
         bpy.ops.object.origin_set(type='ORIGIN_CURSOR', center='BOUNDS')
         context.scene.cursor.location = new_origin
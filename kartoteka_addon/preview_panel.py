@@ -1,8 +1,13 @@
 import os
 from bpy.utils import register_class, unregister_class
 from bpy.types import PropertyGroup, Panel
-from bpy.props import EnumProperty, FloatProperty, StringProperty
-from .skybox_manager import list_skybox_files, setup_hdr_world
+from bpy.props import BoolProperty, EnumProperty, FloatProperty, IntProperty, StringProperty
+from .skybox_manager import hdri_pool_summary, list_skybox_files, update_skybox_file, update_skybox_rotation
+from .compositing_manager import update_compositing_blur
+from .hdri_library import describe, get_entry
+from .image_pool import pool_summary
+from .output_encoder import blocks_interface
+from .quality_tiers import TIER_ITEMS
 
 class RenderSettings(PropertyGroup):
     render_engine: EnumProperty(
@@ -15,6 +20,24 @@ class RenderSettings(PropertyGroup):
         default='BLENDER_EEVEE_NEXT'
     )
 
+    quality_tier: EnumProperty(
+        name="Качество",
+        description="Уровень качества: сэмплы, адаптивный порог шума, шумодав и лимит времени на изображение. "
+                    "Применяется на время рендера, настройки сцены восстанавливаются после",
+        items=TIER_ITEMS,
+        default='SCENE'
+    )
+
+    quality_time_limit: FloatProperty(
+        name="Лимит, с",
+        description="Лимит времени на одно изображение в Cycles (0 — как задано уровнем качества)",
+        default=0.0,
+        min=0.0,
+        max=3600.0,
+        subtype='TIME_ABSOLUTE',
+        unit='TIME_ABSOLUTE'
+    )
+
     # --- Параметры для вкладки "Камера" ---
 
     camera_position: EnumProperty(
@@ -36,6 +59,36 @@ class RenderSettings(PropertyGroup):
         max=5.0,
     )
 
+    rig_fill_lights: BoolProperty(
+        name="Подсветка",
+        description="Включить ключевой и заполняющий свет рига превью (едут вместе с камерой)",
+        default=False
+    )
+
+    rig_light_power: FloatProperty(
+        name="Мощность",
+        description="Множитель мощности подсветки рига",
+        default=1.0,
+        min=0.0,
+        max=10.0
+    )
+
+    border_render: BoolProperty(
+        name="Рамка по объекту",
+        description="Рендерить прозрачный проход объекта только в прямоугольнике, куда он проецируется "
+                    "(плюс отступ); размер картинки остаётся полным",
+        default=False
+    )
+
+    border_margin: FloatProperty(
+        name="Отступ рамки",
+        description="Отступ рамки от проекции объекта, доля кадра",
+        default=0.03,
+        min=0.0,
+        max=0.5,
+        subtype='FACTOR'
+    )
+
     # --- Параметры для вкладки "Композитор" ---
 
     compositing_blur: FloatProperty(
@@ -44,17 +97,32 @@ class RenderSettings(PropertyGroup):
         default=0.0,
         min=-0.0,
         max=1.0,
+        update=update_compositing_blur
     )
 
-    # --- Параметры для вкладки "Скайбокс" ---
+    preview_single_pass: BoolProperty(
+        name="Один проход",
+        description="Рендерить объект и скайбокс одним рендером и сводить в памяти, "
+                    "без промежуточных object.png/skybox.png",
+        default=False
+    )
 
-    def update_skybox_file(self, context):
-        if self.skybox_file:
-            setup_hdr_world(self.skybox_file, rotation=self.skybox_rotation)
+    skybox_cache: BoolProperty(
+        name="Кэш фона",
+        description="Переиспользовать размытый фон, если HDRI, поворот, камера, блюр и разрешение не менялись",
+        default=False
+    )
+
+    skybox_cache_size: IntProperty(
+        name="Размер кэша, МБ",
+        description="Максимальный размер кэша фона на диске",
+        default=512,
+        min=16,
+        max=16384
+    )
 
-    def update_skybox_rotation(self, context):
-        if self.skybox_file:
-            setup_hdr_world(self.skybox_file, rotation=self.skybox_rotation)
+    # --- Параметры для вкладки "Скайбокс" ---
+    # Обновления мира откладываются и объединяются (live_update): не чаще одного за кадр
 
     skybox_file: EnumProperty(
         name="Skybox",
@@ -72,6 +140,74 @@ class RenderSettings(PropertyGroup):
         update=update_skybox_rotation
     )
 
+    skybox_full_res: BoolProperty(
+        name="Полное разрешение HDRI",
+        description="Всегда загружать исходный HDRI, а не уменьшенный прокси (1K/2K/4K) под разрешение рендера",
+        default=False,
+        update=update_skybox_file
+    )
+
+    hdri_pool_count: IntProperty(
+        name="HDRI в памяти",
+        description="Сколько последних HDRI держать загруженными для быстрого переключения",
+        default=3,
+        min=1,
+        max=32
+    )
+
+    hdri_pool_budget: IntProperty(
+        name="Бюджет, МБ",
+        description="Максимальный объём пикселей загруженных HDRI",
+        default=1024,
+        min=64,
+        max=65536
+    )
+
+    # --- Параметры пакетного рендера ---
+
+    batch_outputs: EnumProperty(
+        name="Вывод",
+        description="Что рендерить для каждого объекта пакета",
+        items=[
+            ('PREVIEW', "Превью", "Только превью 1:1"),
+            ('ICON', "Иконки", "Только иконки 3:4"),
+            ('BOTH', "Превью и иконки", "Превью и иконки"),
+        ],
+        default='BOTH'
+    )
+
+    batch_by_parent: BoolProperty(
+        name="По родителям",
+        description="Один рендер на верхнего родителя вместо рендера каждого меша",
+        default=True
+    )
+
+    output_derivatives: StringProperty(
+        name="Производные",
+        description="Дополнительные размеры и форматы через запятую: размер:формат[:качество][:trim], "
+                    "например '1024:jpg:90, 512:webp:85, 256:png:trim'. В интерфейсе требуют Pillow",
+        default=""
+    )
+
+    timing_log_path: StringProperty(
+        name="Лог времени",
+        description="JSON-lines файл, куда дописываются замеры стадий рендера (пусто — не писать)",
+        subtype='FILE_PATH',
+        default=""
+    )
+
+    render_force: BoolProperty(
+        name="Перерендерить всё",
+        description="Игнорировать манифест и рендерить даже неизменившиеся объекты",
+        default=False
+    )
+
+    render_modal: BoolProperty(
+        name="Не блокировать интерфейс",
+        description="Рендерить по стадиям в фоне с прогрессом; Esc отменяет между стадиями и объектами",
+        default=False
+    )
+
     save_path: StringProperty(
         name="Save Path",
         description="Путь для сохранения рендеров",
@@ -95,18 +231,69 @@ class OBJECT_PT_MainPanel(Panel):
 
         layout.separator()
 
-        # Кнопка "Создать превью"
-        layout.operator("object.render_object_preview",
-                        text="Создать превью 1:1",
-                        icon='RENDER_STILL')
+        settings = context.scene.render_settings
+
+        # Кнопки "Создать превью" и "Создать иконку" (разные операторы!);
+        # в неблокирующем режиме обе идут через object.render_modal
+        if settings.render_modal:
+            op = layout.operator("object.render_modal", text="Создать превью 1:1", icon='RENDER_STILL')
+            op.outputs = 'PREVIEW'
+            op.grouping = 'SELECTION'
+            op.force = settings.render_force
+
+            op = layout.operator("object.render_modal", text="Создать иконку формы 3:4",
+                                 icon='RESTRICT_RENDER_OFF')
+            op.outputs = 'ICON'
+            op.grouping = 'SELECTION'
+            op.force = settings.render_force
+        else:
+            layout.operator("object.render_object_preview",
+                            text="Создать превью 1:1",
+                            icon='RENDER_STILL')
+            layout.operator("object.render_object_icon",
+                            text="Создать иконку формы 3:4",
+                            icon='RESTRICT_RENDER_OFF')
+
+        layout.separator()
+
+        # Пакетный рендер всех выделенных объектов
+        row = layout.row(align=True)
+        row.prop(settings, "batch_outputs", text="")
+        row.prop(settings, "batch_by_parent", toggle=True)
+        if settings.render_modal:
+            op = layout.operator("object.render_modal",
+                                 text="Пакетный рендер выделенного",
+                                 icon='RENDER_ANIMATION')
+            op.outputs = settings.batch_outputs
+            op.grouping = 'PARENT' if settings.batch_by_parent else 'OBJECT'
+            op.force = settings.render_force
+        else:
+            op = layout.operator("object.render_batch",
+                                 text="Пакетный рендер выделенного",
+                                 icon='RENDER_ANIMATION')
+            op.outputs = settings.batch_outputs
+            op.by_parent = settings.batch_by_parent
+            op.force = settings.render_force
+
+        op = layout.operator("object.render_matrix",
+                             text="Матрица: ракурсы и материалы",
+                             icon='MOD_ARRAY')
+        op.outputs = settings.batch_outputs
+        op.by_parent = settings.batch_by_parent
+        op.force = settings.render_force
+
+        row = layout.row(align=True)
+        row.prop(settings, "render_modal")
+        row.prop(settings, "render_force")
 
-        # Кнопка "Создать иконку" (использует другой оператор!)
-        layout.operator("object.render_object_icon",
-                        text="Создать иконку формы 3:4",
-                        icon='RESTRICT_RENDER_OFF')
+        layout.separator()
 
         layout.prop(context.scene.render_settings, "save_path", text="Путь сохранения")
         layout.operator("object.set_save_path", text="Выбрать путь")
+        layout.prop(context.scene.render_settings, "output_derivatives")
+        if context.scene.render_settings.output_derivatives and blocks_interface():
+            layout.label(text="Производные требуют Pillow (или фоновый Blender)", icon='ERROR')
+        layout.prop(context.scene.render_settings, "timing_log_path")
 
 
 class OBJECT_PT_RenderPanel(Panel):
@@ -124,8 +311,23 @@ class OBJECT_PT_RenderPanel(Panel):
 
         # Свойства из PropertyGroup
         layout.prop(scene.render_settings, "render_engine", text="Движок")
+        row = layout.row(align=True)
+        row.prop(scene.render_settings, "quality_tier", text="")
+        sub = row.row(align=True)
+        sub.active = scene.render_settings.render_engine == 'CYCLES' and scene.render_settings.quality_tier != 'SCENE'
+        sub.prop(scene.render_settings, "quality_time_limit")
         layout.prop(scene.render_settings, "camera_position", text="Камера")
         layout.prop(scene.render_settings, "camera_distance", text="Дистанция")
+        row = layout.row(align=True)
+        row.prop(scene.render_settings, "rig_fill_lights", toggle=True)
+        sub = row.row(align=True)
+        sub.active = scene.render_settings.rig_fill_lights
+        sub.prop(scene.render_settings, "rig_light_power")
+        row = layout.row(align=True)
+        row.prop(scene.render_settings, "border_render", toggle=True)
+        sub = row.row(align=True)
+        sub.active = scene.render_settings.border_render
+        sub.prop(scene.render_settings, "border_margin", text="Отступ")
 
         layout.separator()
 
@@ -143,8 +345,18 @@ class OBJECT_PT_SkyboxPanel(Panel):
         layout = self.layout
         scene = context.scene
 
+        layout.template_icon_view(scene.render_settings, "skybox_file", show_labels=True, scale=5.0)
         layout.prop(scene.render_settings, "skybox_file", text="HDRI")
+        entry = get_entry(scene.render_settings.skybox_file)
+        if entry:
+            layout.label(text=describe(entry), icon='INFO')
         layout.prop(scene.render_settings, "skybox_rotation", text="Rotation")
+        layout.prop(scene.render_settings, "skybox_full_res")
+
+        row = layout.row(align=True)
+        row.prop(scene.render_settings, "hdri_pool_count", text="В памяти")
+        row.prop(scene.render_settings, "hdri_pool_budget")
+        layout.label(text=hdri_pool_summary(), icon='MEMORY')
 
 
 class OBJECT_PT_CompositingPanel(Panel):
@@ -161,6 +373,14 @@ class OBJECT_PT_CompositingPanel(Panel):
         scene = context.scene
 
         layout.prop(scene.render_settings, "compositing_blur", text="Blur")
+        layout.prop(scene.render_settings, "preview_single_pass")
+
+        row = layout.row(align=True)
+        row.active = scene.render_settings.preview_single_pass
+        row.prop(scene.render_settings, "skybox_cache")
+        row.prop(scene.render_settings, "skybox_cache_size", text="МБ")
+
+        layout.label(text=pool_summary().capitalize(), icon='IMAGE_DATA')
 
 def register():
     register_class(RenderSettings)
@@ -0,0 +1,121 @@
+from . import timings
+
+
+# Уровни качества рендера. Применяются к сцене на время пакета и откатываются после,
+# чтобы сэмплы/шумодав/отскоки сцены пользователя не менялись навсегда.
+# Cycles: адаптивный сэмплинг (порог шума), шумодав и лимит времени на изображение.
+# EEVEE: число сэмплов TAA.
+
+TIERS = {
+    'DRAFT': {
+        "label": "Черновик",
+        "cycles": {
+            "samples": 32,
+            "use_adaptive_sampling": True,
+            "adaptive_threshold": 0.1,
+            "adaptive_min_samples": 0,
+            "time_limit": 5.0,
+            "use_denoising": True,
+            "denoiser": 'OPENIMAGEDENOISE',
+            "max_bounces": 4,
+            "diffuse_bounces": 2,
+            "glossy_bounces": 2,
+            "transmission_bounces": 4,
+        },
+        "eevee": {"taa_render_samples": 16},
+    },
+    'STANDARD': {
+        "label": "Стандарт",
+        "cycles": {
+            "samples": 128,
+            "use_adaptive_sampling": True,
+            "adaptive_threshold": 0.03,
+            "adaptive_min_samples": 0,
+            "time_limit": 20.0,
+            "use_denoising": True,
+            "denoiser": 'OPENIMAGEDENOISE',
+            "max_bounces": 8,
+            "diffuse_bounces": 4,
+            "glossy_bounces": 4,
+            "transmission_bounces": 8,
+        },
+        "eevee": {"taa_render_samples": 64},
+    },
+    'FINAL': {
+        "label": "Финал",
+        "cycles": {
+            "samples": 512,
+            "use_adaptive_sampling": True,
+            "adaptive_threshold": 0.01,
+            "adaptive_min_samples": 0,
+            "time_limit": 0.0,
+            "use_denoising": True,
+            "denoiser": 'OPENIMAGEDENOISE',
+            "max_bounces": 12,
+            "diffuse_bounces": 4,
+            "glossy_bounces": 8,
+            "transmission_bounces": 12,
+        },
+        "eevee": {"taa_render_samples": 256},
+    },
+}
+
+TIER_ITEMS = [
+    ('SCENE', "Как в сцене", "Не менять сэмплы и шумодав сцены"),
+    ('DRAFT', "Черновик", "Быстро: мало сэмплов, грубый порог шума, лимит 5 с на изображение"),
+    ('STANDARD', "Стандарт", "Каталог: адаптивные сэмплы до 128, шумодав, лимит 20 с"),
+    ('FINAL', "Финал", "Максимум качества: до 512 сэмплов, без лимита времени"),
+]
+
+
+def _tier_values(scene, tier, time_limit=0.0):
+    """Список (struct, attr, value) для уровня tier с учётом движка сцены."""
+    values = []
+    if scene.render.engine == 'CYCLES':
+        for attr, value in TIERS[tier]["cycles"].items():
+            if attr == "time_limit" and time_limit > 0:
+                value = time_limit
+            values.append((scene.cycles, attr, value))
+    else:
+        for attr, value in TIERS[tier]["eevee"].items():
+            values.append((scene.eevee, attr, value))
+    return values
+
+
+def apply_tier(scene, tier, time_limit=0.0, saved=None):
+    """
+    Применяет уровень качества к сцене. Прежние значения дописываются в saved
+    (только при первой записи свойства — повторный вызов для другого прохода их не затирает).
+    Возвращает saved для restore_tier.
+    """
+    if saved is None:
+        saved = {}
+    if tier not in TIERS:
+        return saved
+
+    for struct, attr, value in _tier_values(scene, tier, time_limit):
+        if not hasattr(struct, attr):
+            continue  # свойство отсутствует в этой версии Blender
+        key = (struct.as_pointer(), attr)
+        if key not in saved:
+            saved[key] = (struct, attr, getattr(struct, attr))
+        if getattr(struct, attr) != value:
+            setattr(struct, attr, value)
+    return saved
+
+
+def restore_tier(saved):
+    for struct, attr, value in saved.values():
+        setattr(struct, attr, value)
+    saved.clear()
+
+
+def tier_label(tier):
+    return TIERS[tier]["label"] if tier in TIERS else "как в сцене"
+
+
+def tier_summary(tier):
+    """Строка для отчёта: уровень качества и фактическое время рендера."""
+    seconds, count = timings.stage_totals("render:")
+    average = f", в среднем {seconds / count:.2f} с" if count else ""
+    return f"качество: {tier_label(tier).lower()}, рендер {seconds:.1f} с ({count} шт.{average})"
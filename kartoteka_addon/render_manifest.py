@@ -0,0 +1,152 @@
+import hashlib
+import json
+import os
+from array import array
+
+
+# Манифест инкрементального рендера: в папке сохранения лежит JSON
+# {имя файла рендера: хеш входных данных}. Если хеш объекта не изменился
+# и файл на месте — рендер пропускается.
+
+MANIFEST_NAME = "kartoteka_manifest.json"
+
+SIMPLE_PROPERTY_TYPES = {'BOOLEAN', 'INT', 'FLOAT', 'STRING', 'ENUM'}
+
+
+def manifest_path(save_directory):
+    return os.path.join(save_directory, MANIFEST_NAME)
+
+
+def load_manifest(save_directory):
+    path = manifest_path(save_directory)
+    if os.path.isfile(path):
+        try:
+            with open(path, 'r', encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"[Manifest] Не удалось прочитать {path}: {e}")
+    return {}
+
+
+def save_manifest(save_directory, manifest):
+    path = manifest_path(save_directory)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def is_up_to_date(manifest, output_path, input_hash, extra_paths=()):
+    """Хеш совпадает и на месте и сам рендер, и все его производные (extra_paths)."""
+    if manifest.get(os.path.basename(output_path)) != input_hash:
+        return False
+    return all(os.path.isfile(path) for path in (output_path, *extra_paths))
+
+
+def record_output(manifest, output_path, input_hash):
+    manifest[os.path.basename(output_path)] = input_hash
+
+
+def _rna_values(struct):
+    """Простые (не указательные) RNA-свойства структуры — для хеша модификаторов и т.п."""
+    values = []
+    for prop in struct.bl_rna.properties:
+        if prop.identifier == "rna_type" or prop.type not in SIMPLE_PROPERTY_TYPES:
+            continue
+        value = getattr(struct, prop.identifier, None)
+        if prop.type == 'ENUM' and prop.is_enum_flag:
+            value = sorted(value)
+        elif hasattr(value, "__len__") and not isinstance(value, str):
+            value = list(value)
+        values.append((prop.identifier, value))
+    return values
+
+
+def _socket_value(socket):
+    value = getattr(socket, "default_value", None)
+    if value is None:
+        return None
+    if hasattr(value, "__len__") and not isinstance(value, str):
+        return [round(v, 6) for v in value]
+    return round(value, 6) if isinstance(value, float) else value
+
+
+def _hash_buffer(hasher, collection, attr, count, typecode):
+    buffer = array(typecode, bytes(count * array(typecode).itemsize))
+    collection.foreach_get(attr, buffer)
+    hasher.update(buffer.tobytes())
+
+
+def _hash_mesh(hasher, mesh):
+    hasher.update(f"{len(mesh.vertices)}:{len(mesh.loops)}:{len(mesh.polygons)}".encode())
+    _hash_buffer(hasher, mesh.vertices, "co", len(mesh.vertices) * 3, 'f')
+    _hash_buffer(hasher, mesh.loops, "vertex_index", len(mesh.loops), 'i')
+    _hash_buffer(hasher, mesh.polygons, "loop_total", len(mesh.polygons), 'i')
+    _hash_buffer(hasher, mesh.polygons, "material_index", len(mesh.polygons), 'i')
+    _hash_buffer(hasher, mesh.polygons, "use_smooth", len(mesh.polygons), 'b')
+
+    uv_layer = mesh.uv_layers.active
+    if uv_layer:
+        _hash_buffer(hasher, uv_layer.data, "uv", len(uv_layer.data) * 2, 'f')
+
+
+def _hash_material(hasher, material):
+    if material is None:
+        hasher.update(b"<none>")
+        return
+
+    hasher.update(material.name.encode())
+    hasher.update(repr([round(v, 6) for v in material.diffuse_color]).encode())
+    if not material.use_nodes or not material.node_tree:
+        return
+
+    for node in sorted(material.node_tree.nodes, key=lambda n: n.name):
+        image = getattr(node, "image", None)
+        parts = [node.bl_idname, node.name, image.filepath if image else None]
+        parts.extend((inp.identifier, _socket_value(inp)) for inp in node.inputs if not inp.is_linked)
+        hasher.update(repr(parts).encode())
+
+    for link in material.node_tree.links:
+        hasher.update(f"{link.from_node.name}.{link.from_socket.identifier}->"
+                      f"{link.to_node.name}.{link.to_socket.identifier}".encode())
+
+
+def _settings_values(scene, kind):
+    settings = scene.render_settings
+    render = scene.render
+    return [
+        kind,
+        render.engine, render.resolution_x, render.resolution_y, render.resolution_percentage,
+        settings.camera_position, round(settings.camera_distance, 6),
+        round(settings.compositing_blur, 6), settings.preview_single_pass,
+        settings.skybox_file, round(settings.skybox_rotation, 6), settings.skybox_full_res,
+        settings.quality_tier, round(settings.quality_time_limit, 3),
+        settings.rig_fill_lights, round(settings.rig_light_power, 6),
+    ]
+
+
+def compute_input_hash(scene, objs, kind, derivatives=()):
+    """
+    Хеш всего, от чего зависит рендер объекта:
+    геометрия, UV и материалы мешей, модификаторы, мировые матрицы,
+    настройки RenderSettings, разрешение сцены (после подготовки под тип вывода)
+    и разобранные производные (output_encoder.parse_specs).
+    """
+    hasher = hashlib.sha1()
+    hasher.update(repr(_settings_values(scene, kind)).encode())
+    hasher.update(repr([sorted(spec.items()) for spec in derivatives]).encode())
+
+    for obj in sorted(objs, key=lambda o: o.name):
+        hasher.update(obj.name.encode())
+        hasher.update(repr([round(v, 6) for row in obj.matrix_world for v in row]).encode())
+
+        for modifier in obj.modifiers:
+            hasher.update(repr(_rna_values(modifier)).encode())
+
+        if obj.type == 'MESH':
+            _hash_mesh(hasher, obj.data)
+
+        for slot in obj.material_slots:
+            _hash_material(hasher, slot.material)
+
+    return hasher.hexdigest()
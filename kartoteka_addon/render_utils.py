@@ -1,4 +1,9 @@
+import atexit
 import bpy
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
 
 
 def get_or_create_object_collection(obj, base_name="Wall_Collection"):
@@ -52,6 +57,22 @@ def setup_skybox_view_layer():
     print(f"[INFO] Настроен ViewLayer: {view_layer_name}. Все коллекции, кроме Scene Collection, отключены.")
 
 
+def set_active_view_layer(view_layer_name):
+    """
+    Делает ViewLayer активным в окне.
+    В фоновом режиме (blender -b) окна нет: рендер и так идёт по всем слоям сцены,
+    поэтому переключение просто пропускается.
+    """
+    scene = bpy.context.scene
+    if view_layer_name not in scene.view_layers:
+        return False
+
+    window = bpy.context.window
+    if window is not None:
+        window.view_layer = scene.view_layers[view_layer_name]
+    return True
+
+
 def activate_view_layer():
 
     view_layer_name = "ViewLayer"
@@ -85,3 +106,72 @@ def set_film_transparency(enable: bool):
     scene.render.film_transparent = enable
     state = "включена" if enable else "выключена"
     print(f"[INFO] Прозрачность фона рендера {state}.")
+
+
+_session = {"dir": None}
+
+
+def get_session_dir():
+    """Временная папка текущей сессии Blender для промежуточных файлов рендера; удаляется при выходе."""
+    if not _session["dir"] or not os.path.isdir(_session["dir"]):
+        _session["dir"] = tempfile.mkdtemp(prefix="kartoteka_")
+        atexit.register(shutil.rmtree, _session["dir"], True)
+    return _session["dir"]
+
+
+@contextmanager
+def border_region(scene, border):
+    """
+    Рендер только прямоугольника border (min_x, max_x, min_y, max_y в долях кадра)
+    без обрезки: размер картинки остаётся полным, вне рамки — прозрачность.
+    border=None — рендер всего кадра. Настройки рамки сцены восстанавливаются после.
+    """
+    render = scene.render
+    previous = (render.use_border, render.use_crop_to_border,
+                render.border_min_x, render.border_max_x, render.border_min_y, render.border_max_y)
+
+    if border is not None:
+        render.use_border = True
+        render.use_crop_to_border = False
+        render.border_min_x, render.border_max_x, render.border_min_y, render.border_max_y = border
+    else:
+        render.use_border = False
+
+    try:
+        yield
+    finally:
+        (render.use_border, render.use_crop_to_border,
+         render.border_min_x, render.border_max_x, render.border_min_y, render.border_max_y) = previous
+
+
+# --- Стадии пайплайна рендера ---
+# Функции рендера — генераторы: вместо вызова bpy.ops.render.render они отдают через yield
+# запрос RENDER, а между объектами — STEP (точка для прогресса и отмены).
+# Синхронно их выполняет run_stages, неблокирующе — модальный оператор OBJECT_OT_RenderModal.
+
+def render_request(write_still=True):
+    return {"type": 'RENDER', "write_still": write_still}
+
+
+def progress_step(done, total, label=""):
+    return {"type": 'STEP', "done": done, "total": total, "label": label}
+
+
+def run_stages(stages):
+    """
+    Синхронный драйвер стадий: блокирующий рендер на каждом запросе RENDER.
+    Ошибка рендера пробрасывается внутрь генератора, чтобы сработали его except/finally.
+    """
+    error = None
+    while True:
+        try:
+            request = stages.throw(error) if error else next(stages)
+        except StopIteration:
+            return
+        error = None
+
+        if request["type"] == 'RENDER':
+            try:
+                bpy.ops.render.render("EXEC_DEFAULT", write_still=request["write_still"])
+            except Exception as e:
+                error = e
@@ -0,0 +1,339 @@
+"""
+Фоновая генерация размерных вариантов модели по таблице размеров (каталог: одна модель — много SKU).
+
+Запуск (оркестратор):
+    blender -b D:/models/cabinet.blend -P kartoteka_addon/resize_runner.py -- \
+        --collection Cabinet --table D:/sizes.csv --output D:/variants --save-blend --workers 4
+
+Таблица — CSV (заголовок, разделитель ',' или ';') или JSON (список объектов или {"variants": [...]}).
+Колонки: sku (или name), x/width, y/depth, z/height — целевые мировые габариты в единицах сцены
+(пусто или 0 — ось не меняется; --scale 0.01 для сантиметров), необязательные anchor_x/anchor_y/anchor_z
+(MIN/CENTER/MAX) и mode (offset — растяжение, proportional — масштаб от якоря).
+
+Строки делятся на части по числу воркеров; каждый воркер — фоновый Blender с исходным .blend,
+открытым один раз. Для каждой строки вершины коллекции возвращаются к исходным,
+морфятся morph.morph_objects (та же семантика, что у Morph X/Y/Z, по всем вершинам),
+и вариант сохраняется копией в <sku>.blend и/или рендерится в <output>/<sku>.
+Итог пишется в resize_report.json в папке вывода.
+
+Оркестратор можно запустить и обычным python, указав --blend и --blender.
+"""
+
+import argparse
+import csv
+import importlib
+import json
+import math
+import os
+import re
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+try:
+    import bpy
+except ImportError:
+    bpy = None
+
+
+ADDON_DIR = os.path.dirname(os.path.abspath(__file__))
+ADDON_NAME = os.path.basename(ADDON_DIR)
+RESULT_MARKER = "KARTOTEKA_VARIANT:"
+REPORT_NAME = "resize_report.json"
+AXES = (("x", "width"), ("y", "depth"), ("z", "height"))
+ANCHORS = ("MIN", "CENTER", "MAX")
+MODES = {"offset": False, "proportional": True, "prop": True}
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Kartoteka: размерные варианты модели по таблице")
+    parser.add_argument("--blend", help="Исходный .blend (по умолчанию — открытый в Blender)")
+    parser.add_argument("--collection", required=True, help="Коллекция с мешами модели")
+    parser.add_argument("--table", required=True, help="CSV/JSON с размерами вариантов")
+    parser.add_argument("--output", required=True, help="Папка для вариантов")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="Множитель размеров таблицы к единицам сцены (0.01 — таблица в см)")
+    parser.add_argument("--mode", choices=["offset", "proportional"], default="offset",
+                        help="Режим по умолчанию для строк без колонки mode")
+    parser.add_argument("--anchors", type=parse_anchors, default=("CENTER", "CENTER", "MIN"),
+                        help="Якоря X,Y,Z по умолчанию: MIN/CENTER/MAX через запятую")
+    parser.add_argument("--save-blend", action="store_true", help="Сохранять каждый вариант в <sku>.blend")
+    parser.add_argument("--render", choices=["NONE", "PREVIEW", "ICON", "BOTH"], default="NONE",
+                        help="Рендерить превью/иконки каждого варианта в <output>/<sku>")
+    parser.add_argument("--force", action="store_true", help="Рендерить, игнорируя манифест")
+    parser.add_argument("--workers", type=int, default=0, help="Число процессов Blender (0 — авто)")
+    parser.add_argument("--threads", type=int, default=0, help="render.threads на воркер (0 — авто)")
+    parser.add_argument("--timeout", type=float, default=0, help="Таймаут на воркер, сек (0 — без таймаута)")
+    parser.add_argument("--blender", help="Путь к Blender (по умолчанию — текущий)")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--start", type=int, default=0, help=argparse.SUPPRESS)
+    parser.add_argument("--stop", type=int, default=0, help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def parse_anchors(text):
+    """'CENTER,CENTER,MIN' -> кортеж из ровно трёх якорей X, Y, Z."""
+    anchors = tuple(part.strip().upper() for part in text.split(","))
+    if len(anchors) != 3 or any(anchor not in ANCHORS for anchor in anchors):
+        raise argparse.ArgumentTypeError(f"нужны три якоря X,Y,Z из {', '.join(ANCHORS)}: '{text}'")
+    return anchors
+
+
+def script_argv():
+    """Аргументы после '--' (blender -b -P script.py -- ...) или обычные аргументы python."""
+    if "--" in sys.argv:
+        return sys.argv[sys.argv.index("--") + 1:]
+    return sys.argv[1:]
+
+
+# --- Таблица размеров ---
+
+def _read_rows(path):
+    if path.lower().endswith(".json"):
+        with open(path, 'r', encoding="utf-8") as f:
+            data = json.load(f)
+        return data["variants"] if isinstance(data, dict) else data
+
+    with open(path, 'r', encoding="utf-8-sig", newline="") as f:
+        sample = f.read(4096)
+        f.seek(0)
+        delimiter = ";" if sample.count(";") > sample.count(",") else ","
+        return list(csv.DictReader(f, delimiter=delimiter))
+
+
+def _number(value):
+    if value in (None, ""):
+        return 0.0
+    return float(str(value).replace(",", "."))
+
+
+def safe_name(name):
+    return re.sub(r'[\\/:*?"<>|\s]+', "_", str(name)).strip("_") or "variant"
+
+
+def load_table(path, scale=1.0, mode="offset", anchors=("CENTER", "CENTER", "MIN")):
+    """
+    Строки таблицы в виде {"sku", "targets", "anchors", "proportional"}.
+    Ошибки формата — ValueError с номером строки.
+    """
+    variants = []
+    for number, raw in enumerate(_read_rows(path), start=1):
+        row = {str(key).strip().lower(): value for key, value in raw.items() if key is not None}
+        try:
+            targets = tuple(_number(row.get(axis, row.get(alias))) * scale for axis, alias in AXES)
+            row_anchors = tuple(str(row.get(f"anchor_{axis}") or default).strip().upper()
+                                for (axis, _alias), default in zip(AXES, anchors))
+        except ValueError as e:
+            raise ValueError(f"строка {number}: {e}")
+        if any(anchor not in ANCHORS for anchor in row_anchors):
+            raise ValueError(f"строка {number}: якорь должен быть одним из {', '.join(ANCHORS)}")
+        if any(target < 0 for target in targets):
+            raise ValueError(f"строка {number}: отрицательный размер")
+
+        row_mode = str(row.get("mode") or mode).strip().lower()
+        if row_mode not in MODES:
+            raise ValueError(f"строка {number}: режим должен быть offset или proportional, а не '{row_mode}'")
+        sku = row.get("sku") or row.get("name") or f"variant_{number:03d}"
+        variants.append({
+            "sku": safe_name(sku),
+            "targets": targets,
+            "anchors": row_anchors,
+            "proportional": MODES[row_mode],
+        })
+    return variants
+
+
+# --- Воркер (внутри фонового Blender с открытым .blend) ---
+
+def enable_addon():
+    """
+    Возвращает модуль аддона, включая его при необходимости.
+    Если аддон уже включён (в т.ч. как extension bl_ext.*.kartoteka_addon) — берём его.
+    """
+    import addon_utils
+
+    for name in bpy.context.preferences.addons.keys():
+        if name.split(".")[-1] == ADDON_NAME:
+            return importlib.import_module(name)
+
+    parent_dir = os.path.dirname(ADDON_DIR)
+    if parent_dir not in sys.path:
+        sys.path.insert(0, parent_dir)
+    addon_utils.enable(ADDON_NAME, default_set=True)
+    return importlib.import_module(ADDON_NAME)
+
+
+def run_worker(args):
+    addon = enable_addon()
+    morph = importlib.import_module(addon.__name__ + ".morph")
+    operators = importlib.import_module(addon.__name__ + ".operators")
+
+    scene = bpy.context.scene
+    if args.threads > 0:
+        scene.render.threads_mode = 'FIXED'
+        scene.render.threads = args.threads
+
+    collection = bpy.data.collections.get(args.collection)
+    meshes = [obj for obj in collection.all_objects if obj.type == 'MESH'] if collection else []
+    if not meshes:
+        print(f"[Resize] В коллекции '{args.collection}' нет мешей")
+        return 1
+
+    # Исходные координаты: каждый вариант морфится от них, а не от предыдущего
+    originals = {}
+    for obj in meshes:
+        if obj.data.as_pointer() not in originals:
+            originals[obj.data.as_pointer()] = (obj, morph.read_mesh_selection(obj, selected_only=False)[0])
+
+    variants = load_table(args.table, args.scale, args.mode, args.anchors)
+    for variant in variants[args.start:args.stop or None]:
+        started = time.perf_counter()
+        result = {"sku": variant["sku"], "blend": None, "renders": [], "error": None}
+        try:
+            for obj, co in originals.values():
+                morph.write_mesh_coords(obj, co.copy())
+
+            morphed = morph.morph_objects(bpy.context, meshes, variant["targets"], variant["anchors"],
+                                          variant["proportional"], selected_only=False, world_space=True)
+            box = morph.compute_start_box(bpy.context, meshes, selected_only=False, world_space=True)
+            result["vertices"] = sum(count for _name, count, _seconds in morphed or [])
+            result["size"] = [round(box[f"max-{axis}"] - box[f"min-{axis}"], 6) for axis, _alias in AXES]
+
+            if args.save_blend:
+                result["blend"] = os.path.join(args.output, variant["sku"] + ".blend")
+                bpy.ops.wm.save_as_mainfile(filepath=result["blend"], copy=True)
+            if args.render != "NONE":
+                scene.render_settings.save_path = os.path.join(args.output, variant["sku"])
+                outputs = operators.run_render_batch(scene, meshes, args.render, True, args.force)
+                result["renders"] = [path for path, _error, _skipped in outputs]
+                errors = [error for _path, error, _skipped in outputs if error]
+                result["error"] = "; ".join(errors) or None
+        except Exception as e:
+            result["error"] = str(e)
+
+        result["seconds"] = round(time.perf_counter() - started, 3)
+        # Результат печатается сразу после строки: при падении воркера готовые варианты не теряются
+        print(RESULT_MARKER + json.dumps(result, ensure_ascii=False), flush=True)
+    return 0
+
+
+# --- Оркестратор ---
+
+def run_chunk(blender, source, args, start, stop, threads):
+    """Запускает фоновый Blender на строках [start, stop). Возвращает (результаты, ошибка)."""
+    cmd = [
+        blender, "-b", source,
+        "-P", os.path.abspath(__file__),
+        "--",
+        "--worker",
+        "--collection", args.collection,
+        "--table", os.path.abspath(args.table),
+        "--output", os.path.abspath(args.output),
+        "--scale", repr(args.scale),
+        "--mode", args.mode,
+        "--anchors", ",".join(args.anchors),
+        "--render", args.render,
+        "--threads", str(threads),
+        "--start", str(start),
+        "--stop", str(stop),
+    ]
+    if args.save_blend:
+        cmd.append("--save-blend")
+    if args.force:
+        cmd.append("--force")
+
+    try:
+        proc = subprocess.run(cmd, capture_output=True, text=True, encoding="utf-8", errors="replace",
+                              timeout=args.timeout or None)
+    except subprocess.TimeoutExpired as e:
+        stdout = e.stdout.decode("utf-8", "replace") if isinstance(e.stdout, bytes) else (e.stdout or "")
+        return _parse_results(stdout), f"таймаут {args.timeout} с"
+
+    results = _parse_results(proc.stdout)
+    if proc.returncode != 0 or len(results) < stop - start:
+        tail = "\n".join((proc.stderr or proc.stdout).splitlines()[-5:])
+        return results, f"код выхода {proc.returncode}: {tail}"
+    return results, None
+
+
+def _parse_results(stdout):
+    return [json.loads(line[len(RESULT_MARKER):]) for line in stdout.splitlines()
+            if line.startswith(RESULT_MARKER)]
+
+
+def run_pool(args):
+    blender = args.blender or (bpy.app.binary_path if bpy else None)
+    if not blender:
+        print("[RESIZE] Не указан путь к Blender (--blender)")
+        return 1
+    source = args.blend or (bpy.data.filepath if bpy else None)
+    if not source or not os.path.isfile(source):
+        print(f"[RESIZE] Не найден исходный .blend: {source}")
+        return 1
+
+    try:
+        variants = load_table(args.table, args.scale, args.mode, args.anchors)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"[RESIZE] Ошибка таблицы {args.table}: {e}")
+        return 1
+    if not variants:
+        print("[RESIZE] Таблица пуста")
+        return 0
+
+    os.makedirs(args.output, exist_ok=True)
+    cpu_count = os.cpu_count() or 1
+    if args.render == "NONE":
+        workers = args.workers or max(1, min(len(variants), cpu_count))
+    else:
+        workers = args.workers or max(1, min(len(variants), cpu_count // max(1, args.threads or 4)))
+    threads = args.threads or max(1, cpu_count // workers)
+    chunk = math.ceil(len(variants) / workers)
+    ranges = [(start, min(start + chunk, len(variants))) for start in range(0, len(variants), chunk)]
+    print(f"[RESIZE] Вариантов: {len(variants)}, воркеров: {len(ranges)}, потоков рендера на воркер: {threads}")
+
+    start_time = time.perf_counter()
+    results, failures = [], []
+    pool = ThreadPoolExecutor(max_workers=len(ranges))
+    try:
+        futures = {pool.submit(run_chunk, blender, source, args, start, stop, threads): (start, stop)
+                   for start, stop in ranges}
+        for future in as_completed(futures):
+            start, stop = futures[future]
+            chunk_results, error = future.result()
+            results.extend(chunk_results)
+            for result in chunk_results:
+                status = f"ОШИБКА — {result['error']}" if result["error"] else "OK"
+                print(f"[RESIZE] {result['sku']}: {status} ({result['seconds']} с)")
+            if error:
+                failures.append({"rows": [start, stop], "error": error})
+                print(f"[RESIZE] ОШИБКА воркера (строки {start + 1}–{stop}): {error}")
+    except KeyboardInterrupt:
+        print("[RESIZE] Прервано.")
+        pool.shutdown(wait=False, cancel_futures=True)
+        return 130
+    pool.shutdown()
+
+    failed = [result for result in results if result["error"]]
+    missing = len(variants) - len(results)
+    report_path = os.path.join(args.output, REPORT_NAME)
+    with open(report_path, 'w', encoding="utf-8") as f:
+        json.dump({"source": source, "collection": args.collection, "table": args.table,
+                   "variants": sorted(results, key=lambda result: result["sku"]), "workers": failures},
+                  f, ensure_ascii=False, indent=2)
+
+    print(f"[RESIZE] Готово за {time.perf_counter() - start_time:.1f} с: "
+          f"{len(results) - len(failed)} успешно, {len(failed)} с ошибками, {missing} не обработано. "
+          f"Отчёт: {report_path}")
+    return 1 if failed or missing else 0
+
+
+def main():
+    args = parse_args(script_argv())
+    if args.worker:
+        return run_worker(args)
+    return run_pool(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,155 @@
+import bpy
+import hashlib
+import json
+import os
+import tempfile
+
+from . import image_pool
+
+
+# Размытый фон превью зависит только от HDRI, его поворота, камеры, блюра и разрешения.
+# Кэш хранит его как EXR на диске (с ограничением по размеру); в памяти фоны живут
+# в общем image_pool, который сам ограничивает число загруженных картинок.
+
+CACHE_DIR_NAME = "kartoteka_skybox_cache"
+
+stats = {"hits": 0, "misses": 0}
+
+
+def get_cache_dir():
+    path = os.path.join(tempfile.gettempdir(), CACHE_DIR_NAME)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def cache_file_path(key):
+    return os.path.join(get_cache_dir(), f"{key}.exr")
+
+
+def capture_slot_path(key):
+    """Путь для слота File Output: Blender сам допишет номер кадра вместо ####."""
+    return f"{key}_####"
+
+
+def captured_file_path(scene, key):
+    return os.path.join(get_cache_dir(), f"{key}_{scene.frame_current:04d}.exr")
+
+
+def _round(values, digits=6):
+    return [round(v, digits) for v in values]
+
+
+def _camera_depsgraph(scene, cam):
+    """Depsgraph слоя, в котором есть камера (слой скайбокса её может исключать)."""
+    for view_layer in scene.view_layers:
+        if view_layer.objects.get(cam.name) is not None:
+            return view_layer.depsgraph
+    return bpy.context.evaluated_depsgraph_get()
+
+
+def background_key(scene, blur):
+    """
+    Ключ кэша фона. Возвращает None, если мир сцены не собран setup_hdr_world —
+    тогда фон нельзя описать ключом и кэш не используется.
+    """
+    world = scene.world
+    cam = scene.camera
+    if not world or not world.use_nodes or not cam:
+        return None
+
+    node_env = world.node_tree.nodes.get("Skybox_Environment")
+    if not node_env or not node_env.image:
+        return None
+
+    hdr_path = bpy.path.abspath(node_env.image.filepath)
+    if not os.path.isfile(hdr_path):
+        return None
+    hdr_stat = os.stat(hdr_path)
+
+    # Матрицы — вычисленные (после view_layer.update() в setup_camera), а не исходные:
+    # исходные до вычисления depsgraph описывают камеру предыдущего объекта
+    depsgraph = _camera_depsgraph(scene, cam)
+    cam_matrix = cam.evaluated_get(depsgraph).matrix_world
+    cam_data = cam.data
+    dof = cam_data.dof
+    if dof.focus_object:
+        focus_matrix = dof.focus_object.evaluated_get(depsgraph).matrix_world
+        focus_distance = (focus_matrix.translation - cam_matrix.translation).length
+    else:
+        focus_distance = dof.focus_distance
+
+    render = scene.render
+    parts = [
+        os.path.normcase(os.path.abspath(hdr_path)), hdr_stat.st_mtime, hdr_stat.st_size,
+        round(scene.render_settings.skybox_rotation, 4),
+        _round(v for row in cam_matrix for v in row),
+        _round((cam_data.lens, cam_data.sensor_width, cam_data.sensor_height,
+                cam_data.shift_x, cam_data.shift_y)),
+        cam_data.sensor_fit,
+        dof.use_dof, _round((dof.aperture_fstop, focus_distance)),
+        round(blur, 4),
+        render.engine, render.resolution_x, render.resolution_y, render.resolution_percentage,
+    ]
+    if render.engine == 'CYCLES':
+        parts.append(scene.cycles.samples)
+
+    return hashlib.sha1(json.dumps(parts).encode("utf-8")).hexdigest()[:20]
+
+
+def get_background(key):
+    """Ищет фон в кэше (в памяти через image_pool, иначе на диске). Считает попадания и промахи."""
+    path = cache_file_path(key)
+    if os.path.isfile(path):
+        os.utime(path)  # mtime — отметка последнего использования для вытеснения
+        stats["hits"] += 1
+        return image_pool.acquire(path, name=f"KartotekaSky_{key[:8]}")
+
+    stats["misses"] += 1
+    return None
+
+
+def store_background(scene, key, max_bytes):
+    """
+    Переносит записанный нодом File Output фон на место в кэше,
+    загружает его в память и вытесняет старые файлы сверх max_bytes.
+    """
+    written = captured_file_path(scene, key)
+    if not os.path.isfile(written):
+        print(f"[SkyCache] Фон не записан: {written}")
+        return None
+
+    path = cache_file_path(key)
+    os.replace(written, path)
+    evict_disk(max_bytes)
+    return image_pool.acquire(path, name=f"KartotekaSky_{key[:8]}")
+
+
+def evict_disk(max_bytes):
+    """Удаляет самые давно использованные файлы, пока кэш не влезет в max_bytes."""
+    cache_dir = get_cache_dir()
+    entries = []
+    for fname in os.listdir(cache_dir):
+        if fname.endswith(".exr"):
+            path = os.path.join(cache_dir, fname)
+            st = os.stat(path)
+            entries.append((st.st_mtime, st.st_size, path))
+
+    total = sum(size for _mtime, size, _path in entries)
+    for _mtime, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            image_pool.release(path)
+            os.remove(path)
+            total -= size
+        except OSError as e:
+            print(f"[SkyCache] Не удалось удалить {path}: {e}")
+
+
+def reset_stats():
+    stats["hits"] = 0
+    stats["misses"] = 0
+
+
+def stats_summary():
+    return f"кэш фона: {stats['hits']} попаданий, {stats['misses']} промахов"
@@ -1,7 +1,10 @@
 import bpy
 import os
 import math
+from collections import OrderedDict
 
+from . import hdri_library, hdri_proxy, image_pool, live_update
+from .hdri_library import get_assets_dir
 from .node_utils import (
     get_or_create_node,
     ensure_link
@@ -12,27 +15,97 @@ def get_addon_dir():
     return os.path.dirname(__file__)
 
 
-def get_assets_dir():
-    return os.path.join(get_addon_dir(), "assets")
-
-
 def list_skybox_files():
     """
-    Ищет в папке 'assets' файлы с расширениями HDR/EXR/PNG/JPG/JPEG
-    и формирует список для EnumProperty.
+    Элементы EnumProperty со всеми HDR/EXR/PNG/JPG из папки 'assets'.
+    Список берётся из индекса hdri_library (перестраивается только при изменении папки).
     """
-    path = get_assets_dir()
-    if not os.path.isdir(path):
-        print(f"[Skybox] Не найдена папка: {path}")
-        return []
+    return hdri_library.enum_items()
+
+
+# Пул HDRI: недавно использованные окружения остаются загруженными, чтобы возврат
+# к ним не перечитывал файл с диска. Лимиты — число HDRI и бюджет памяти пикселей;
+# лишние (самые давно выбранные и никем не используемые) удаляются.
+# Сами datablock'и живут в image_pool (повторная загрузка того же пути — тот же datablock).
+
+DEFAULT_POOL_COUNT = 3
+DEFAULT_POOL_BUDGET_MB = 1024
+
+_hdri_pool = OrderedDict()  # абсолютный путь -> Image
+
+# Имена мира и ноды Mapping для быстрого пути (поворот без полного setup_hdr_world).
+# Хранятся имена, а не ссылки RNA: после undo/redo и перезагрузки файла datablock'и
+# пересоздаются и старые указатели могут смотреть в освобождённую память.
+_world_nodes = {"world": None, "mapping": None}
+
+
+def _pool_limits():
+    settings = getattr(bpy.context.scene, "render_settings", None)
+    if settings is None:
+        return DEFAULT_POOL_COUNT, DEFAULT_POOL_BUDGET_MB * 1024 * 1024
+    return settings.hdri_pool_count, settings.hdri_pool_budget * 1024 * 1024
+
+
+def _alive(image):
+    try:
+        image.name
+        return True
+    except ReferenceError:
+        return False
+
+
+def _pool_key(path):
+    return os.path.normcase(os.path.abspath(path))
+
+
+def acquire_hdri(path):
+    """Возвращает загруженный HDRI из пула (или загружает его); последний выбранный — в конце LRU."""
+    key = _pool_key(path)
+    image = image_pool.acquire(key)
+    _hdri_pool[key] = image
+    _hdri_pool.move_to_end(key)
+    return image
+
+
+def evict_hdri(max_count=None, max_bytes=None, keep=None):
+    """Удаляет самые давно выбранные HDRI, пока пул больше max_count или max_bytes."""
+    default_count, default_bytes = _pool_limits()
+    max_count = default_count if max_count is None else max_count
+    max_bytes = default_bytes if max_bytes is None else max_bytes
+
+    for key in [key for key, image in _hdri_pool.items() if not _alive(image)]:
+        del _hdri_pool[key]
+
+    for key in list(_hdri_pool):
+        count, total = hdri_pool_stats()
+        if count <= max_count and total <= max_bytes:
+            break
+        if key == keep or _hdri_pool[key].users > 0:
+            continue
+        del _hdri_pool[key]
+        image_pool.release(key)
+        print(f"[Skybox] HDRI выгружен из памяти: {os.path.basename(key)}")
+
+
+def hdri_pool_stats():
+    images = [image for image in _hdri_pool.values() if _alive(image)]
+    return len(images), sum(image_pool.image_bytes(image) for image in images)
+
 
-    items = []
-    for fname in os.listdir(path):
-        ext = os.path.splitext(fname)[1].lower()
-        if ext in (".hdr", ".exr", ".png", ".jpg", ".jpeg"):
-            items.append((fname, fname, f"Использовать {fname} в качестве скайбокса"))
-    items.sort(key=lambda x: x[0].lower())
-    return items
+def hdri_pool_summary():
+    count, total = hdri_pool_stats()
+    return f"HDRI в памяти: {count} шт., {total / (1024 * 1024):.1f} МБ"
+
+
+def clear_hdri_pool():
+    """Забывает HDRI пула и ноды мира (после загрузки другого .blend ссылки на datablock'и недействительны)."""
+    _hdri_pool.clear()
+    forget_world_nodes()
+
+
+def forget_world_nodes():
+    """Сбрасывает запомненные имена мира и Mapping (после undo/redo и загрузки файла)."""
+    _world_nodes.update(world=None, mapping=None)
 
 
 def delete_all_world_nodes():
@@ -49,13 +122,36 @@ def delete_all_world_nodes():
         nodes.remove(node)
 
 
-def setup_hdr_world(hdr_file, rotation=0.0, blur=0.0):
+def resolve_hdri_path(hdr_file, full_res=False):
+    """
+    Путь к картинке для мира: наименьший готовый прокси, которого хватает для текущего
+    разрешения рендера, или исходник (full_res, нет подходящего прокси, не HDR/EXR).
+    Прокси здесь не заказываются — это делает hdri_library при перестройке индекса.
+    """
+    hdr_path = os.path.join(get_assets_dir(), hdr_file)
+    entry = hdri_library.get_entry(hdr_file)
+    if full_res or entry is None or entry["format"] not in ("HDR", "EXR"):
+        return hdr_path
+
+    source_width = entry["resolution"][0] if entry["resolution"] else None
+    scene = bpy.context.scene
+    settings = getattr(scene, "render_settings", None)
+    needed_width = hdri_proxy.required_width(scene, blurred=bool(settings and settings.compositing_blur > 0.0))
+    return hdri_proxy.select_image_path(hdr_path, source_width, needed_width)
+
+
+def setup_hdr_world(hdr_file, rotation=0.0, blur=0.0, full_res=None):
     assets_dir = get_assets_dir()
     hdr_path = os.path.join(assets_dir, hdr_file)
     if not os.path.isfile(hdr_path):
         print(f"[Skybox] Файл не найден: {hdr_path}")
         return
 
+    if full_res is None:
+        settings = getattr(bpy.context.scene, "render_settings", None)
+        full_res = bool(settings and settings.skybox_full_res)
+    hdr_path = resolve_hdri_path(hdr_file, full_res)
+
     # Создаём (или получаем) мир по имени "AddonHDRWorld"
     world_name = "AddonHDRWorld"
     world = bpy.data.worlds.get(world_name)
@@ -120,17 +216,59 @@ def setup_hdr_world(hdr_file, rotation=0.0, blur=0.0):
         current_image_path = bpy.path.abspath(node_env.image.filepath)
 
     if not current_image_path or os.path.abspath(hdr_path) != os.path.abspath(current_image_path):
-        node_env.image = bpy.data.images.load(hdr_path)
+        node_env.image = acquire_hdri(hdr_path)
+        if hdr_path != os.path.join(assets_dir, hdr_file):
+            print(f"[Skybox] {hdr_file}: прокси {node_env.image.size[0]}x{node_env.image.size[1]}")
+        # После переназначения прежний HDRI свободен и может быть выгружен по лимитам пула
+        evict_hdri(keep=_pool_key(hdr_path))
 
     if node_mapping:
         node_mapping.inputs["Rotation"].default_value[2] = math.radians(rotation)
+    _world_nodes.update(world=world.name, mapping=node_mapping.name if node_mapping else None)
+
+
+def set_skybox_rotation(rotation):
+    """
+    Быстрый путь поворота: пишет угол прямо в запомненный Mapping, только если он изменился.
+    Если мир ещё не настроен или ноды пропали — полный setup_hdr_world.
+    Возвращает False, когда быстрый путь недоступен.
+    """
+    world_name, mapping_name = _world_nodes["world"], _world_nodes["mapping"]
+    world = bpy.data.worlds.get(world_name) if world_name else None
+    node_mapping = None
+    if mapping_name and world is not None and world.node_tree and bpy.context.scene.world == world:
+        node_mapping = world.node_tree.nodes.get(mapping_name)
+    if node_mapping is None:
+        forget_world_nodes()
+        return False
+
+    value = node_mapping.inputs["Rotation"].default_value
+    angle = math.radians(rotation)
+    if abs(value[2] - angle) > 1e-6:
+        value[2] = angle
+    return True
+
+
+def sync_skybox_resolution(scene):
+    """Перевыбирает прокси HDRI под разрешение рендера и уже наведённую камеру сцены."""
+    settings = scene.render_settings
+    if settings.skybox_file:
+        setup_hdr_world(settings.skybox_file, rotation=settings.skybox_rotation)
+
+
+def _apply_skybox_file():
+    sync_skybox_resolution(bpy.context.scene)
+
+
+def _apply_skybox_rotation():
+    settings = bpy.context.scene.render_settings
+    if settings.skybox_file and not set_skybox_rotation(settings.skybox_rotation):
+        setup_hdr_world(settings.skybox_file, rotation=settings.skybox_rotation)
 
 
 def update_skybox_file(self, context):
-    if self.skybox_file:
-        setup_hdr_world(self.skybox_file, rotation=self.skybox_rotation)
+    live_update.schedule("skybox_file", _apply_skybox_file)
 
 
 def update_skybox_rotation(self, context):
-    if self.skybox_file:
-        setup_hdr_world(self.skybox_file, rotation=self.skybox_rotation)
+    live_update.schedule("skybox_rotation", _apply_skybox_rotation)
@@ -0,0 +1,93 @@
+import json
+import os
+import time
+from contextlib import contextmanager
+
+
+# Замер времени стадий пайплайна превью/иконок.
+# Стадии суммируются за весь запуск и отдельно по объектам (begin_object/end_object).
+# Стадия вокруг yield render_request() меряет сам рендер — и в синхронном, и в модальном драйвере.
+
+_batch = {}
+_counts = {}
+_objects = []
+_current = {"name": None, "stages": None, "start": 0.0}
+
+
+def reset():
+    _batch.clear()
+    _counts.clear()
+    _objects.clear()
+    _current.update(name=None, stages=None, start=0.0)
+
+
+@contextmanager
+def stage(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        _batch[name] = _batch.get(name, 0.0) + elapsed
+        _counts[name] = _counts.get(name, 0) + 1
+        if _current["stages"] is not None:
+            _current["stages"][name] = _current["stages"].get(name, 0.0) + elapsed
+
+
+def begin_object(name):
+    _current.update(name=name, stages={}, start=time.perf_counter())
+
+
+def end_object(**extra):
+    if _current["stages"] is None:
+        return
+    entry = {
+        "name": _current["name"],
+        "total": time.perf_counter() - _current["start"],
+        "stages": _current["stages"],
+    }
+    entry.update(extra)
+    _objects.append(entry)
+    _current.update(name=None, stages=None, start=0.0)
+
+
+def object_timings():
+    return list(_objects)
+
+
+def batch_totals():
+    return dict(_batch)
+
+
+def stage_totals(prefix):
+    """Суммарное время и число замеров стадий, чьё имя начинается с prefix (например, 'render:')."""
+    names = [name for name in _batch if name.startswith(prefix)]
+    return sum(_batch[name] for name in names), sum(_counts[name] for name in names)
+
+
+def summary(limit=4):
+    """Короткая строка для отчёта оператора: самые долгие стадии за запуск."""
+    if not _batch:
+        return "время: нет данных"
+    top = sorted(_batch.items(), key=lambda item: item[1], reverse=True)[:limit]
+    per_object = ""
+    if _objects:
+        per_object = f", в среднем {sum(o['total'] for o in _objects) / len(_objects):.2f} с/объект"
+    return "время: " + ", ".join(f"{name} {seconds:.2f} с" for name, seconds in top) + per_object
+
+
+def append_jsonl(path, **meta):
+    """Дописывает в JSON-lines файл строку на каждый объект и итоговую строку запуска."""
+    timestamp = time.strftime("%Y-%m-%dT%H:%M:%S")
+    lines = [dict(meta, kind="object", time=timestamp, **entry) for entry in _objects]
+    lines.append(dict(meta, kind="batch", time=timestamp, objects=len(_objects), stages=_batch))
+
+    try:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'a', encoding="utf-8") as f:
+            for line in lines:
+                f.write(json.dumps(line, ensure_ascii=False) + "\n")
+    except OSError as e:
+        print(f"[Timings] Не удалось записать {path}: {e}")